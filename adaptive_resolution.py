@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+自适应输入分辨率
+根据最近一段时间的前向耗时和 CPU 负载，在 320/416/512/608 之间切换网络输入尺寸，
+使单帧延迟保持在目标值以内
+"""
+
+import collections
+from datetime import datetime
+
+try:
+    from system_monitor import SystemMonitor
+except ImportError:  # psutil 未安装时只根据推理耗时调整
+    SystemMonitor = None
+
+INPUT_SIZES = (320, 416, 512, 608)
+
+
+class ResolutionController:
+    """带滞回的输入尺寸控制器"""
+
+    def __init__(self, detector, target_latency, sizes=INPUT_SIZES, window=10,
+                 upscale_margin=0.7, cpu_high=90.0, monitor=None):
+        """
+        Args:
+            detector: YoloDetector，切换时调用 detector.set_input_size
+            target_latency: 目标单帧前向耗时（秒）
+            sizes: 可选输入尺寸，从小到大
+            window: 滑动窗口长度（帧），切换后需重新积累满一个窗口才会再次切换
+            upscale_margin: 预计放大后的耗时低于 target_latency * upscale_margin 才放大
+            cpu_high: CPU 使用率超过该值（%）时不再放大，且接近目标时提前缩小
+            monitor: SystemMonitor，为 None 时自动创建（psutil 不可用时不考虑 CPU 负载）
+        """
+        self.detector = detector
+        self.target_latency = target_latency
+        self.sizes = sorted(sizes)
+        self.upscale_margin = upscale_margin
+        self.cpu_high = cpu_high
+        self.times = collections.deque(maxlen=window)
+        self.switches = []
+
+        if monitor is None and SystemMonitor is not None:
+            monitor = SystemMonitor()
+        self.monitor = monitor  # 后台采样，每帧读取最新的 CPU 使用率不阻塞
+
+        if detector.input_size not in self.sizes:
+            self.sizes = sorted(set(self.sizes) | {detector.input_size})
+
+    @property
+    def size(self):
+        return self.detector.input_size
+
+    def observe(self, inference_time):
+        """
+        记录一帧的前向耗时，必要时切换输入尺寸
+
+        Returns:
+            发生切换时返回新的输入尺寸，否则返回 None
+        """
+        self.times.append(inference_time)
+        if len(self.times) < self.times.maxlen:
+            return None
+
+        avg_time = sum(self.times) / len(self.times)
+        cpu = self.monitor.get_cpu_percent() if self.monitor is not None else None
+        index = self.sizes.index(self.size)
+
+        # 超出目标，或 CPU 已饱和且接近目标：缩小
+        if index > 0 and (avg_time > self.target_latency or
+                          (cpu is not None and cpu > self.cpu_high and avg_time > self.target_latency * 0.9)):
+            reason = f"平均前向 {avg_time*1000:.1f} ms > 目标 {self.target_latency*1000:.0f} ms"
+            if avg_time <= self.target_latency:
+                reason = f"CPU 使用率 {cpu:.0f}% > {self.cpu_high:.0f}%，平均前向 {avg_time*1000:.1f} ms 接近目标"
+            return self._switch(self.sizes[index - 1], reason, avg_time, cpu)
+
+        # 计算量与输入面积成正比，预计放大后仍有余量才放大
+        if index < len(self.sizes) - 1 and (cpu is None or cpu <= self.cpu_high):
+            next_size = self.sizes[index + 1]
+            expected = avg_time * (next_size / self.size) ** 2
+            if expected < self.target_latency * self.upscale_margin:
+                reason = (f"平均前向 {avg_time*1000:.1f} ms，预计 {next_size} 需 {expected*1000:.1f} ms "
+                          f"< {self.upscale_margin:.0%} 目标")
+                return self._switch(next_size, reason, avg_time, cpu)
+
+        return None
+
+    def _switch(self, new_size, reason, avg_time, cpu):
+        old_size = self.size
+        self.detector.set_input_size(new_size)
+        self.times.clear()
+
+        event = {
+            'timestamp': datetime.now().isoformat(),
+            'from': old_size,
+            'to': new_size,
+            'avg_inference_time': avg_time,
+            'cpu_percent': cpu,
+            'reason': reason
+        }
+        self.switches.append(event)
+        print(f"[自适应分辨率] {old_size} -> {new_size}: {reason}")
+        return new_size
+
+    def print_summary(self):
+        """打印切换记录"""
+        print(f"\n[自适应分辨率] 当前输入尺寸: {self.size}x{self.size}，共切换 {len(self.switches)} 次")
+        for event in self.switches:
+            print(f"  {event['timestamp']}  {event['from']} -> {event['to']}: {event['reason']}")
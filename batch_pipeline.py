@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+流水线批量检测
+读取/预处理、推理、绘制/保存/分析三个阶段通过有界队列衔接，
+JPEG 解码和编码与前向传播重叠执行；大目录可按进程分片并行检测
+"""
+
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import cv2 as cv
+
+from yolo_detector import YoloDetector, split_batch_outputs, detected_output_path, CONFIDENCE, THRESHOLD
+
+_DONE = object()  # 阶段结束标记
+
+
+class MonitoredQueue(queue.Queue):
+    """记录占用情况的有界队列"""
+
+    def __init__(self, name, maxsize):
+        super().__init__(maxsize)
+        self.name = name
+        self.samples = 0
+        self.total_depth = 0
+        self.max_depth = 0
+        self.full_waits = 0
+
+    def put(self, item, block=True, timeout=None):
+        if self.full():
+            self.full_waits += 1
+        super().put(item, block, timeout)
+        self._sample()
+
+    def get(self, block=True, timeout=None):
+        item = super().get(block, timeout)
+        self._sample()
+        return item
+
+    def _sample(self):
+        depth = self.qsize()
+        self.samples += 1
+        self.total_depth += depth
+        self.max_depth = max(self.max_depth, depth)
+
+    def stats(self):
+        """返回队列占用统计"""
+        avg_depth = self.total_depth / self.samples if self.samples else 0
+        return {
+            'capacity': self.maxsize,
+            'avg_depth': avg_depth,
+            'max_depth': self.max_depth,
+            'avg_occupancy': avg_depth / self.maxsize if self.maxsize else 0,
+            'full_waits': self.full_waits
+        }
+
+
+class StageStats:
+    """记录单个阶段的忙碌时间"""
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.items = 0
+        self.busy_time = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, elapsed, items=1):
+        with self._lock:
+            self.busy_time += elapsed
+            self.items += items
+
+    def stats(self, wall_time):
+        """返回阶段统计，utilization 为所有线程的平均忙碌比例"""
+        capacity = wall_time * self.workers
+        return {
+            'workers': self.workers,
+            'items': self.items,
+            'busy_time': self.busy_time,
+            'utilization': self.busy_time / capacity if capacity > 0 else 0
+        }
+
+
+class DetectionPipeline:
+    """三阶段流水线：读取线程池 -> 推理（独占网络） -> 写出线程池"""
+
+    def __init__(self, detector, write_fn, read_workers=2, write_workers=2,
+                 read_queue_depth=4, write_queue_depth=4, batch_size=1):
+        """
+        Args:
+            detector: YoloDetector，只在推理阶段使用
+            write_fn: 写出阶段回调 write_fn(image_path, img, detection)，返回检测结果字典
+            read_workers: 读取/预处理线程数
+            write_workers: 绘制/保存/分析线程数
+            read_queue_depth: 读取 -> 推理队列深度
+            write_queue_depth: 推理 -> 写出队列深度
+            batch_size: 推理阶段每次前向的最大图片数
+        """
+        self.detector = detector
+        self.write_fn = write_fn
+        self.read_workers = read_workers
+        self.write_workers = write_workers
+        self.read_queue_depth = read_queue_depth
+        self.write_queue_depth = write_queue_depth
+        self.batch_size = batch_size
+        self.last_stats = None
+
+    def run(self, image_paths, confidence=CONFIDENCE, threshold=THRESHOLD):
+        """
+        处理一组图片
+
+        Returns:
+            按输入顺序排列的检测结果字典列表
+        """
+        path_q = queue.Queue()
+        for item in enumerate(image_paths):
+            path_q.put(item)
+
+        read_q = MonitoredQueue('read', self.read_queue_depth)
+        write_q = MonitoredQueue('write', self.write_queue_depth)
+        read_stage = StageStats('read', self.read_workers)
+        infer_stage = StageStats('infer', 1)
+        write_stage = StageStats('write', self.write_workers)
+
+        results = {}
+        results_lock = threading.Lock()
+
+        def reader():
+            # 无论如何都要发出结束标记，否则推理阶段会一直等待
+            try:
+                while True:
+                    try:
+                        index, image_path = path_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    start = time.time()
+                    try:
+                        img = cv.imread(image_path)
+                        if img is None:
+                            print(f"❌ 无法读取图片: {image_path}")
+                            continue
+                        blob, letterbox = self.detector.make_blob(img)
+                    except Exception as e:
+                        print(f"❌ 读取/预处理失败: {image_path}: {e}")
+                        continue
+                    finally:
+                        read_stage.add(time.time() - start)
+                    read_q.put((index, image_path, img, blob, letterbox))
+            finally:
+                read_q.put(_DONE)
+
+        def writer():
+            while True:
+                item = write_q.get()
+                if item is _DONE:
+                    break
+                index, image_path, img, detection = item
+                start = time.time()
+                try:
+                    result = self.write_fn(image_path, img, detection)
+                except Exception as e:
+                    print(f"❌ 写出失败: {image_path}: {e}")
+                    result = None
+                write_stage.add(time.time() - start)
+                if result:
+                    with results_lock:
+                        results[index] = result
+
+        readers = [threading.Thread(target=reader, daemon=True) for _ in range(self.read_workers)]
+        writers = [threading.Thread(target=writer, daemon=True) for _ in range(self.write_workers)]
+
+        wall_start = time.time()
+        for t in readers + writers:
+            t.start()
+
+        # 推理阶段在当前线程执行，独占网络
+        try:
+            active_readers = self.read_workers
+            while active_readers > 0:
+                batch = []
+                item = read_q.get()
+                if item is _DONE:
+                    active_readers -= 1
+                    continue
+                batch.append(item)
+                # 队列中已有的图片凑成一批，不等待
+                while len(batch) < self.batch_size:
+                    try:
+                        item = read_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        active_readers -= 1
+                        continue
+                    batch.append(item)
+
+                start = time.time()
+                detections = self._infer(batch, confidence, threshold)
+                infer_stage.add(time.time() - start, len(batch))
+                for (index, image_path, img, _, _), detection in zip(batch, detections):
+                    write_q.put((index, image_path, img, detection))
+        finally:
+            for _ in writers:
+                write_q.put(_DONE)
+            for t in writers:
+                t.join()
+
+        wall_time = time.time() - wall_start
+        self.last_stats = {
+            'wall_time': wall_time,
+            'stages': {s.name: s.stats(wall_time) for s in (read_stage, infer_stage, write_stage)},
+            'queues': {q.name: q.stats() for q in (read_q, write_q)}
+        }
+        return [results[i] for i in sorted(results)]
+
+    def _infer(self, batch, confidence, threshold):
+        """对一批已预处理的图片前向并后处理"""
+        imgs = [item[2] for item in batch]
+        blobs = [item[3] for item in batch]
+        letterboxes = [item[4] for item in batch]
+        if len(batch) == 1:
+            (H, W) = imgs[0].shape[:2]
+            layerOutputs, inference_time = self.detector.forward_blob(blobs[0])
+            boxes, confidences, classIDs = self.detector.postprocess(layerOutputs, W, H, confidence, threshold,
+                                                                     letterboxes[0])
+            return [self.detector.make_result(boxes, confidences, classIDs, inference_time)]
+
+        blobImg = np.concatenate(blobs)
+        layerOutputs, batch_time = self.detector.forward_blob(blobImg)
+        per_image = split_batch_outputs(layerOutputs, len(batch))
+        return self.detector.postprocess_batch(imgs, per_image, batch_time, confidence, threshold, letterboxes)
+
+    def print_stats(self):
+        """打印各阶段占用情况"""
+        if not self.last_stats:
+            return
+        stats = self.last_stats
+        print(f"\n[流水线统计] 总耗时: {stats['wall_time']*1000:.2f} ms")
+        stage_names = {'read': '读取/预处理', 'infer': '推理', 'write': '绘制/保存/分析'}
+        for name, s in stats['stages'].items():
+            print(f"  {stage_names[name]:<12} 线程: {s['workers']}  处理: {s['items']}  "
+                  f"忙碌: {s['busy_time']*1000:.2f} ms  利用率: {s['utilization']:.1%}")
+        for name, q in stats['queues'].items():
+            print(f"  队列 {name:<6} 容量: {q['capacity']}  平均深度: {q['avg_depth']:.2f}  "
+                  f"最大深度: {q['max_depth']}  平均占用: {q['avg_occupancy']:.1%}  满队列等待: {q['full_waits']}")
+
+
+# 多进程分片检测：子进程通过 fork 继承父进程已加载的网络，权重页写时复制共享
+_worker_detector = None
+_worker_options = None
+
+
+def _init_worker(worker_counter, threads_per_worker, cpu_list, detector_args, options):
+    """子进程初始化：设置 OpenCV 线程数并绑定 CPU，保存检测参数（spawn 模式下子进程不继承父进程的全局变量）"""
+    global _worker_detector, _worker_options
+
+    _worker_options = options
+    with worker_counter.get_lock():
+        worker_index = worker_counter.value
+        worker_counter.value += 1
+
+    cv.setNumThreads(threads_per_worker)
+    if cpu_list and hasattr(os, 'sched_setaffinity'):
+        start = (worker_index * threads_per_worker) % len(cpu_list)
+        cpus = {cpu_list[(start + i) % len(cpu_list)] for i in range(threads_per_worker)}
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError as e:
+            print(f"⚠️  无法绑定 CPU {sorted(cpus)}: {e}")
+
+    # spawn 模式下子进程没有继承网络，需要各自加载
+    if _worker_detector is None:
+        _worker_detector = YoloDetector(**detector_args)
+
+
+def _detect_task(image_path):
+    """子进程任务：读取、检测、绘制并保存一张图片"""
+    confidence, threshold, save = _worker_options
+    img = cv.imread(image_path)
+    if img is None:
+        return image_path, None, None
+    detection = _worker_detector.detect(img, confidence, threshold)
+    detection['worker_pid'] = os.getpid()
+
+    output_path = None
+    if save:
+        _worker_detector.draw(img, detection['boxes'], detection['confidences'], detection['classIDs'])
+        output_path = detected_output_path(image_path)
+        cv.imwrite(output_path, img)
+    return image_path, output_path, detection
+
+
+def sharded_detect(detector, image_paths, workers=2, threads_per_worker=1,
+                   confidence=CONFIDENCE, threshold=THRESHOLD, save=True, start_method=None):
+    """
+    多进程分片检测
+
+    父进程先完成一次前向（网络初始化和层融合），再 fork 子进程，
+    子进程共享权重页而不是各自占用 240+ MB。每个子进程设置
+    cv.setNumThreads(threads_per_worker) 并绑定到互不重叠的 CPU，避免超额订阅。
+
+    Args:
+        detector: 已加载的 YoloDetector
+        image_paths: 图片路径列表
+        workers: 子进程数
+        threads_per_worker: 每个子进程的 OpenCV 线程数
+        confidence: 置信度阈值
+        threshold: NMS 阈值
+        save: 是否在子进程中绘制并保存结果图片
+        start_method: 'fork' 或 'spawn'，为 None 时支持 fork 则用 fork（Windows 只有 spawn）
+
+    Returns:
+        按输入顺序排列的 (image_path, output_path, detection) 列表，读取失败的图片 detection 为 None
+    """
+    global _worker_detector
+
+    if start_method is None:
+        start_method = 'fork' if 'fork' in mp.get_all_start_methods() else 'spawn'
+    if start_method == 'fork':
+        ctx = mp.get_context('fork')
+        # 预热：让层融合后的权重在 fork 前就位
+        size = detector.input_size
+        detector.forward(np.zeros((size, size, 3), dtype=np.uint8))
+        _worker_detector = detector
+    else:
+        ctx = mp.get_context('spawn')
+        _worker_detector = None
+
+    cpu_list = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+    detector_args = {
+        'config_path': detector.config_path,
+        'weights_path': detector.weights_path,
+        'labels_path': detector.labels_path,
+        'input_size': detector.input_size,
+        'letterbox': detector.letterbox,
+        'load_mode': detector.load_mode,
+        'nms': detector.nms,
+        'classes': detector.classes
+    }
+    worker_counter = ctx.Value('i', 0)
+
+    try:
+        with ctx.Pool(workers, initializer=_init_worker,
+                      initargs=(worker_counter, threads_per_worker, cpu_list, detector_args,
+                                (confidence, threshold, save))) as pool:
+            return list(pool.imap(_detect_task, image_paths))
+    finally:
+        _worker_detector = None
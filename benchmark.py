@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+"""
+检测流水线离线基准测试
+分阶段计时（解码、blob、前向、输出解码、NMS、绘制、imwrite、分析），
+输出各阶段 p50/p95/p99、吞吐量和峰值内存（JSON）。
+没有真实权重时可按 cfg/yolov3.cfg 生成随机权重，用于发现后处理和 I/O 的性能回退。
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+import cv2 as cv
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from detection_analyzer import DetectionAnalyzer
+from model_loader import file_identity
+from yolo_detector import YoloDetector, decode_outputs, split_batch_outputs, configPath, weightsPath, \
+    CONFIDENCE, THRESHOLD
+
+STAGES = ['decode', 'blob', 'forward', 'output_decode', 'nms', 'draw', 'imwrite', 'analysis']
+
+
+def parse_darknet_cfg(cfg_path):
+    """解析 Darknet cfg，返回 [{'type': ..., key: value}, ...]"""
+    sections = []
+    with open(cfg_path, 'rt') as f:
+        for line in f:
+            line = line.split('#')[0].strip()
+            if not line:
+                continue
+            if line.startswith('['):
+                sections.append({'type': line[1:-1]})
+            else:
+                key, value = line.split('=', 1)
+                sections[-1][key.strip()] = value.strip()
+    return sections
+
+
+def random_weights_path(cfg_path, seed=0):
+    """随机权重的缓存路径，文件名包含 cfg 内容哈希和随机种子，换用其他 cfg 时不会复用形状不匹配的权重"""
+    digest = file_identity(cfg_path)['sha256'][:16]
+    return os.path.join(tempfile.gettempdir(), f'yolo.random.{digest}.{seed}.weights')
+
+
+def generate_random_weights(cfg_path, out_path, seed=0):
+    """
+    按 cfg 结构生成随机 Darknet 权重文件
+
+    只用于性能测试：网络结构和真实模型相同，检测结果没有意义。
+    """
+    rng = np.random.default_rng(seed)
+    sections = parse_darknet_cfg(cfg_path)
+    channels = int(sections[0].get('channels', 3))
+    out_channels = []  # 每层输出通道数
+
+    with open(out_path, 'wb') as f:
+        # 头部: major, minor, revision (int32) + seen (int64)
+        np.array([0, 2, 0], dtype=np.int32).tofile(f)
+        np.array([0], dtype=np.int64).tofile(f)
+
+        for section in sections[1:]:
+            layer_type = section['type']
+            prev = out_channels[-1] if out_channels else channels
+
+            if layer_type == 'convolutional':
+                filters = int(section['filters'])
+                size = int(section['size'])
+                if int(section.get('batch_normalize', 0)):
+                    # biases, scales, rolling_mean, rolling_variance
+                    for value in (0.0, 1.0, 0.0, 1.0):
+                        np.full(filters, value, dtype=np.float32).tofile(f)
+                else:
+                    np.zeros(filters, dtype=np.float32).tofile(f)
+                fan_in = prev * size * size
+                weights = rng.standard_normal(filters * fan_in) * np.sqrt(1.0 / fan_in)
+                weights.astype(np.float32).tofile(f)
+                out_channels.append(filters)
+            elif layer_type == 'route':
+                layers = [int(x) for x in section['layers'].split(',')]
+                index = len(out_channels)
+                out_channels.append(sum(out_channels[l if l >= 0 else index + l] for l in layers))
+            else:
+                # shortcut / upsample / yolo / maxpool 不改变通道数
+                out_channels.append(prev)
+    return out_path
+
+
+def make_synthetic_images(out_dir, count, sizes=((640, 480), (1280, 720), (1920, 1080)), seed=0):
+    """生成合成 JPEG 图片（平滑噪声 + 随机矩形），解码开销与真实照片接近"""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(count):
+        w, h = sizes[i % len(sizes)]
+        img = cv.resize(rng.integers(0, 255, (h // 16, w // 16, 3), dtype=np.uint8), (w, h))
+        for _ in range(8):
+            x, y = int(rng.integers(0, w - 50)), int(rng.integers(0, h - 50))
+            color = [int(c) for c in rng.integers(0, 255, 3)]
+            cv.rectangle(img, (x, y), (x + int(rng.integers(20, w // 3)), y + int(rng.integers(20, h // 3))), color, -1)
+        path = os.path.join(out_dir, f"synthetic_{i:04d}.jpg")
+        cv.imwrite(path, img)
+        paths.append(path)
+    return paths
+
+
+def peak_rss_mb():
+    """进程峰值常驻内存 (MB)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 单位为 KB，macOS 为字节
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def summarize(samples):
+    """单个阶段的计时统计（毫秒）"""
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000
+    return {
+        'count': len(values),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p95_ms': float(np.percentile(values, 95)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'total_ms': float(values.sum())
+    }
+
+
+def run_config(detector, image_paths, batch_size, out_dir, repeat=1,
+               confidence=CONFIDENCE, threshold=THRESHOLD):
+    """
+    以一种输入尺寸 / 批大小跑完所有图片
+
+    blob 和 forward 按批计时，其余阶段按图片计时。
+
+    Returns:
+        该配置的统计字典
+    """
+    timings = {stage: [] for stage in STAGES}
+    analyzer = DetectionAnalyzer()
+    images = 0
+    size = detector.input_size
+
+    # 预热：首次前向包含网络初始化，不计入
+    warm = [np.zeros((size, size, 3), dtype=np.uint8)] * batch_size
+    detector.forward_batch(warm)
+
+    wall_start = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(image_paths), batch_size):
+            paths = image_paths[i:i + batch_size]
+
+            imgs = []
+            for path in paths:
+                start = time.perf_counter()
+                img = cv.imread(path)
+                timings['decode'].append(time.perf_counter() - start)
+                if img is not None:
+                    imgs.append((path, img))
+            if not imgs:
+                continue
+
+            start = time.perf_counter()
+            blobImg = cv.dnn.blobFromImages([img for _, img in imgs], 1.0/255.0, (size, size), None, True, False)
+            timings['blob'].append(time.perf_counter() - start)
+
+            layerOutputs, forward_time = detector.forward_blob(blobImg)
+            timings['forward'].append(forward_time)
+            per_image = split_batch_outputs(layerOutputs, len(imgs))
+
+            for (path, img), outputs in zip(imgs, per_image):
+                (H, W) = img.shape[:2]
+
+                start = time.perf_counter()
+                boxes, confidences, classIDs = decode_outputs(outputs, W, H, confidence)
+                timings['output_decode'].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                idxs = cv.dnn.NMSBoxes(boxes, confidences, confidence, threshold)
+                idxs = np.asarray(idxs, dtype=np.int64).reshape(-1)
+                boxes, confidences, classIDs = boxes[idxs].tolist(), confidences[idxs].tolist(), classIDs[idxs].tolist()
+                timings['nms'].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                detector.draw(img, boxes, confidences, classIDs)
+                timings['draw'].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                cv.imwrite(os.path.join(out_dir, os.path.basename(path)), img)
+                timings['imwrite'].append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                analyzer.analyze_detection_result(boxes, confidences, classIDs, detector.labels,
+                                                  forward_time / len(imgs), verbose=False)
+                timings['analysis'].append(time.perf_counter() - start)
+                images += 1
+
+    wall_time = time.perf_counter() - wall_start
+    return {
+        'input_size': size,
+        'batch_size': batch_size,
+        'images': images,
+        'wall_time_s': wall_time,
+        'throughput_ips': images / wall_time if wall_time > 0 else 0,
+        'stages': {stage: summarize(samples) for stage, samples in timings.items()},
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+
+def print_report(report):
+    """打印基准测试结果表"""
+    for result in report['results']:
+        print(f"\n[输入 {result['input_size']}  批大小 {result['batch_size']}]  "
+              f"图片: {result['images']}  吞吐量: {result['throughput_ips']:.2f} 张/秒  "
+              f"峰值内存: {result['peak_rss_mb'] or 0:.0f} MB")
+        print(f"  {'阶段':<14} {'次数':>6} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'合计 ms':>12}")
+        for stage in STAGES:
+            s = result['stages'][stage]
+            if s is None:
+                continue
+            print(f"  {stage:<14} {s['count']:>6} {s['p50_ms']:>10.2f} {s['p95_ms']:>10.2f} "
+                  f"{s['p99_ms']:>10.2f} {s['total_ms']:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='YOLO 检测流水线基准测试')
+    parser.add_argument('--images', type=str, default='data',
+                        help='测试图片目录 (默认: data)')
+    parser.add_argument('-p', '--pattern', type=str, default='*.jpg',
+                        help='图片匹配模式 (默认: *.jpg)')
+    parser.add_argument('--synthetic', type=int, default=0,
+                        help='使用 N 张合成图片代替图片目录')
+    parser.add_argument('--sizes', type=str, default='320,416,608',
+                        help='输入尺寸列表 (默认: 320,416,608)')
+    parser.add_argument('--batch-sizes', type=str, default='1,4',
+                        help='批大小列表 (默认: 1,4)')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='每种配置重复遍历图片的次数 (默认: 1)')
+    parser.add_argument('--config', type=str, default=configPath,
+                        help=f'cfg 配置文件，非默认 cfg 时使用随机权重 (默认: {configPath})')
+    parser.add_argument('--random-weights', action='store_true',
+                        help='使用按 cfg 生成的随机权重（没有真实权重时自动启用）')
+    parser.add_argument('-c', '--confidence', type=float, default=CONFIDENCE,
+                        help='置信度阈值 (默认: 0.5)')
+    parser.add_argument('-t', '--threshold', type=float, default=THRESHOLD,
+                        help='NMS 阈值 (默认: 0.4)')
+    parser.add_argument('-o', '--output', type=str, default='benchmark_report.json',
+                        help='JSON 结果文件 (默认: benchmark_report.json)')
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.config):
+        parser.error(f"--config: 文件不存在: {args.config}")
+
+    weights = weightsPath
+    # 真实权重只对应默认 cfg
+    custom_cfg = os.path.abspath(args.config) != os.path.abspath(configPath)
+    if args.random_weights or custom_cfg or not os.path.exists(weightsPath):
+        weights = random_weights_path(args.config)
+        if not os.path.exists(weights):
+            print(f"[INFO] 生成随机权重: {weights}")
+            # 先写临时文件再重命名，生成中途中断不会留下被误用的残缺文件
+            tmp_path = f"{weights}.{os.getpid()}.tmp"
+            generate_random_weights(args.config, tmp_path)
+            os.replace(tmp_path, weights)
+        print("[INFO] 使用随机权重，检测结果没有意义，仅用于性能测试")
+
+    work_dir = tempfile.mkdtemp(prefix='yolo-bench-')
+    try:
+        if args.synthetic:
+            image_dir = os.path.join(work_dir, 'images')
+            os.makedirs(image_dir)
+            image_paths = make_synthetic_images(image_dir, args.synthetic)
+        else:
+            image_paths = sorted(glob.glob(os.path.join(args.images, args.pattern)))
+        if not image_paths:
+            print(f"❌ 没有找到图片: {os.path.join(args.images, args.pattern)}")
+            return
+
+        out_dir = os.path.join(work_dir, 'output')
+        os.makedirs(out_dir)
+
+        detector = YoloDetector(config_path=args.config, weights_path=weights)
+        sizes = [int(x) for x in args.sizes.split(',')]
+        batch_sizes = [int(x) for x in args.batch_sizes.split(',')]
+
+        report = {
+            'config': {
+                'cfg': args.config,
+                'images': len(image_paths),
+                'synthetic': bool(args.synthetic),
+                'random_weights': weights != weightsPath,
+                'sizes': sizes,
+                'batch_sizes': batch_sizes,
+                'repeat': args.repeat,
+                'confidence': args.confidence,
+                'threshold': args.threshold,
+                'opencv': cv.__version__,
+                'threads': cv.getNumThreads()
+            },
+            'results': []
+        }
+
+        for size in sizes:
+            detector.set_input_size(size)
+            for batch_size in batch_sizes:
+                print(f"[INFO] 输入 {size}，批大小 {batch_size}...")
+                report['results'].append(run_config(detector, image_paths, batch_size, out_dir, args.repeat,
+                                                    args.confidence, args.threshold))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_report(report)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\n基准测试结果已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
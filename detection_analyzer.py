@@ -4,18 +4,31 @@ YOLO 检测结果分析工具
 配合 yolo-detection-analysis skill 使用
 """
 
+import collections
 import json
 import time
 from datetime import datetime
 
+from streaming_stats import StreamingStats
+
 
 class DetectionAnalyzer:
     """检测结果分析器"""
 
-    def __init__(self):
-        self.results_history = []
+    def __init__(self, history_size=None, writer=None):
+        """
+        Args:
+            history_size: 保留的最近记录数，为 None 时保留全部历史；
+                          设置后 results_history 为定长环形缓冲区，长时间运行内存不再增长，
+                          全程统计由 stats（StreamingStats）在线汇总
+            writer: ReportWriter，每条记录同时追加写入报告日志（见 report_log.py）
+        """
+        self.history_size = history_size
+        self.writer = writer
+        self.results_history = [] if history_size is None else collections.deque(maxlen=history_size)
+        self.stats = StreamingStats()
 
-    def analyze_detection_result(self, boxes, confidences, classIDs, labels, inference_time=None):
+    def analyze_detection_result(self, boxes, confidences, classIDs, labels, inference_time=None, verbose=True):
         """
         分析单次检测结果
 
@@ -25,35 +38,18 @@ class DetectionAnalyzer:
             classIDs: 类别 ID 列表
             labels: 类别标签列表
             inference_time: 推理时间（秒）
+            verbose: 是否打印分析报告，为 False 时只记录到历史（适合视频逐帧记录）
         """
-        print("\n" + "=" * 60)
-        print("YOLO 检测结果分析报告")
-        print("=" * 60)
-        print(f"分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-
         # 基本统计
         total_detections = len(boxes)
         avg_confidence = sum(confidences) / len(confidences) if confidences else 0
 
-        print("[基本信息]")
-        print(f"  检测框数量: {total_detections}")
-        print(f"  平均置信度: {avg_confidence:.2%}")
-
-        if inference_time:
-            fps = 1.0 / inference_time if inference_time > 0 else 0
-            print(f"  推理时间: {inference_time*1000:.2f} ms")
-            print(f"  FPS: {fps:.2f}")
-
         # 类别分布
         class_distribution = {}
         for cid in classIDs:
             class_name = labels[cid]
             class_distribution[class_name] = class_distribution.get(class_name, 0) + 1
 
-        print(f"\n[检测类别分布]")
-        for class_name, count in sorted(class_distribution.items(), key=lambda x: x[1], reverse=True):
-            print(f"  {class_name}: {count} 个")
-
         # 置信度分析
         confidence_levels = {
             'high': [],      # > 0.8
@@ -69,6 +65,55 @@ class DetectionAnalyzer:
             else:
                 confidence_levels['low'].append((i, conf))
 
+        if verbose:
+            self._print_report(boxes, confidences, classIDs, labels, inference_time,
+                               total_detections, avg_confidence, class_distribution, confidence_levels)
+
+        # 保存到历史
+        result_record = {
+            'timestamp': datetime.now().isoformat(),
+            'total_detections': total_detections,
+            'avg_confidence': avg_confidence,
+            'class_distribution': class_distribution,
+            'confidence_levels': {
+                'high': len(confidence_levels['high']),
+                'medium': len(confidence_levels['medium']),
+                'low': len(confidence_levels['low'])
+            },
+            'inference_time': inference_time
+        }
+        self.results_history.append(result_record)
+        self.stats.update(confidences, class_distribution, result_record['confidence_levels'], inference_time)
+        if self.writer is not None:
+            # 附带逐框置信度，重放时可以还原置信度统计
+            self.writer.write(dict(result_record, confidences=[round(float(c), 4) for c in confidences]))
+
+        if verbose:
+            print("\n" + "=" * 60)
+
+        return result_record
+
+    def _print_report(self, boxes, confidences, classIDs, labels, inference_time,
+                      total_detections, avg_confidence, class_distribution, confidence_levels):
+        """打印单次检测的分析报告"""
+        print("\n" + "=" * 60)
+        print("YOLO 检测结果分析报告")
+        print("=" * 60)
+        print(f"分析时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+
+        print("[基本信息]")
+        print(f"  检测框数量: {total_detections}")
+        print(f"  平均置信度: {avg_confidence:.2%}")
+
+        if inference_time:
+            fps = 1.0 / inference_time if inference_time > 0 else 0
+            print(f"  推理时间: {inference_time*1000:.2f} ms")
+            print(f"  FPS: {fps:.2f}")
+
+        print(f"\n[检测类别分布]")
+        for class_name, count in sorted(class_distribution.items(), key=lambda x: x[1], reverse=True):
+            print(f"  {class_name}: {count} 个")
+
         print(f"\n[置信度分布]")
         print(f"  高置信度 (>0.8): {len(confidence_levels['high'])} 个 "
               f"[{len(confidence_levels['high'])/total_detections*100:.1f}%]" if total_detections > 0 else "")
@@ -95,25 +140,6 @@ class DetectionAnalyzer:
         print(f"\n[优化建议]")
         self._provide_recommendations(confidence_levels, total_detections, avg_confidence, inference_time)
 
-        # 保存到历史
-        result_record = {
-            'timestamp': datetime.now().isoformat(),
-            'total_detections': total_detections,
-            'avg_confidence': avg_confidence,
-            'class_distribution': class_distribution,
-            'confidence_levels': {
-                'high': len(confidence_levels['high']),
-                'medium': len(confidence_levels['medium']),
-                'low': len(confidence_levels['low'])
-            },
-            'inference_time': inference_time
-        }
-        self.results_history.append(result_record)
-
-        print("\n" + "=" * 60)
-
-        return result_record
-
     def _get_quality_label(self, confidence):
         """获取质量标签"""
         if confidence > 0.8:
@@ -177,7 +203,8 @@ class DetectionAnalyzer:
             if inference_time > 0.3:
                 recommendations.append(
                     f"⚡ 推理时间较长 ({inference_time*1000:.0f}ms)，建议："
-                    f"\n     - 减小输入尺寸 (如从 416x416 到 320x320)"
+                    f"\n     - 减小输入尺寸 (如从 416x416 到 320x320，--input-size 320)"
+                    f"\n     - 或用 --adaptive-latency 按目标延迟自动切换输入尺寸"
                     f"\n     - 使用 GPU 加速"
                     f"\n     - 考虑使用更轻量的模型"
                 )
@@ -228,12 +255,45 @@ class DetectionAnalyzer:
             print(f"  推理时间: {latest['inference_time']*1000:.2f}ms vs {previous['inference_time']*1000:.2f}ms "
                   f"({'↓ 更快' if latest['inference_time'] < previous['inference_time'] else '↑ 更慢'})")
 
+    def replay_record(self, record):
+        """重放报告日志中的一条记录（见 report_log.load_report）"""
+        confidences = record.pop('confidences', [])
+        self.results_history.append(record)
+        self.stats.update(confidences, record['class_distribution'], record['confidence_levels'],
+                          record['inference_time'])
+
+    def merge(self, other):
+        """合并另一个分析器（例如其他进程）的统计，并追加其保留的历史记录"""
+        self.stats.merge(other.stats)
+        self.results_history.extend(other.results_history)
+        return self
+
+    def print_summary(self):
+        """打印全程汇总统计"""
+        stats = self.stats
+        if stats.frames == 0:
+            return
+
+        print(f"\n[全程统计] 共 {stats.frames} 次检测")
+        print(f"  每次检测数量: 平均 {stats.detections.mean:.2f}  标准差 {stats.detections.std:.2f}  "
+              f"最多 {stats.detections.max}")
+        if stats.confidence.count:
+            print(f"  置信度: 平均 {stats.confidence.mean:.2%}  标准差 {stats.confidence.std:.2%}")
+        if stats.latency.count:
+            p = stats.latency_percentiles()
+            print(f"  推理时间: 平均 {stats.latency.mean*1000:.2f} ms  标准差 {stats.latency.std*1000:.2f} ms  "
+                  f"p50 {p['p50']*1000:.2f} ms  p95 {p['p95']*1000:.2f} ms  p99 {p['p99']*1000:.2f} ms")
+        if stats.class_counts:
+            top = ", ".join(f"{name} {count}" for name, count in stats.class_counts.most_common(5))
+            print(f"  最多的类别: {top}")
+
     def export_report(self, filename="detection_report.json"):
-        """导出分析报告"""
+        """导出分析报告（全程汇总 + 保留的历史记录）"""
         report = {
             'analysis_time': datetime.now().isoformat(),
-            'total_analyses': len(self.results_history),
-            'history': self.results_history
+            'total_analyses': self.stats.frames,
+            'summary': self.stats.to_dict(),
+            'history': list(self.results_history)
         }
 
         with open(filename, 'w', encoding='utf-8') as f:
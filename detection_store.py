@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+列式检测结果存储
+检测框、置信度、类别 ID 和图片 ID 保存为 NumPy 结构化数组，分块追加写入原始二进制文件，
+读取时用 np.memmap 映射，百万级检测的类别分布、置信度直方图等查询按块向量化执行，
+无需整体载入内存
+"""
+
+import json
+import os
+
+import numpy as np
+
+DETECTION_DTYPE = np.dtype([
+    ('image_id', '<i4'),
+    ('x', '<i4'),
+    ('y', '<i4'),
+    ('w', '<i4'),
+    ('h', '<i4'),
+    ('confidence', '<f4'),
+    ('class_id', '<i2'),
+])
+
+IMAGE_DTYPE = np.dtype([
+    ('image_id', '<i4'),
+    ('num_detections', '<i4'),
+    ('inference_time', '<f4'),
+])
+
+DETECTIONS_FILE = 'detections.bin'
+IMAGES_FILE = 'images.bin'
+PATHS_FILE = 'paths.txt'
+META_FILE = 'store.json'
+STORE_VERSION = 1
+STORE_FLUSH_EVERY = 32  # 批量检测时每多少张图片刷新一次，崩溃时最多丢失这么多张
+
+
+class DetectionStore:
+    """追加写入的检测结果存储（单线程写入）"""
+
+    def __init__(self, path, chunk_size=65536, flush_every=None):
+        """
+        Args:
+            path: 存储目录，已存在时在末尾追加
+            chunk_size: 内存中缓冲的检测数，写满后追加到磁盘
+            flush_every: 每记录多少张图片刷新一次，限制进程崩溃时丢失的结果，
+                         为 None 时只在检测缓冲写满和 close 时写入
+        """
+        self.path = path
+        self.flush_every = flush_every
+        os.makedirs(path, exist_ok=True)
+        _write_meta(path)
+
+        self._buffer = np.empty(chunk_size, dtype=DETECTION_DTYPE)
+        self._filled = 0
+        self._images = []
+        self._paths = []
+
+        self.next_image_id = _recover(path)
+
+    def add(self, image_path, boxes, confidences, classIDs, inference_time=None):
+        """
+        记录一张图片的检测结果
+
+        Args:
+            image_path: 图片路径
+            boxes: [[x, y, w, h], ...] 或 (N, 4) 数组
+            confidences: 置信度
+            classIDs: 类别 ID
+            inference_time: 推理时间（秒）
+
+        Returns:
+            图片 ID
+        """
+        image_id = self.next_image_id
+        self.next_image_id += 1
+
+        boxes = np.asarray(boxes, dtype=np.int32).reshape(-1, 4)
+        n = len(boxes)
+        start = 0
+        while start < n:
+            if self._filled == len(self._buffer):
+                self._flush_detections()
+            count = min(n - start, len(self._buffer) - self._filled)
+            chunk = self._buffer[self._filled:self._filled + count]
+            chunk['image_id'] = image_id
+            chunk['x'], chunk['y'], chunk['w'], chunk['h'] = boxes[start:start + count].T
+            chunk['confidence'] = np.asarray(confidences, dtype=np.float32)[start:start + count]
+            chunk['class_id'] = np.asarray(classIDs, dtype=np.int16)[start:start + count]
+            self._filled += count
+            start += count
+
+        self._images.append((image_id, n, np.nan if inference_time is None else inference_time))
+        self._paths.append(image_path)
+        if self.flush_every and len(self._images) >= self.flush_every:
+            self.flush()
+        return image_id
+
+    def add_result(self, result):
+        """记录 detect_objects 返回的结果字典"""
+        return self.add(result['image_path'], result['boxes'], result['confidences'], result['classIDs'],
+                        result.get('inference_time'))
+
+    def _flush_detections(self):
+        if self._filled:
+            with open(os.path.join(self.path, DETECTIONS_FILE), 'ab') as f:
+                f.write(self._buffer[:self._filled].tobytes())
+            self._filled = 0
+
+    def flush(self):
+        """
+        把缓冲的检测和图片记录追加到磁盘
+
+        images.bin 最后写入，作为提交记录：中途崩溃留下的检测行和路径在下次打开时截掉。
+        """
+        self._flush_detections()
+        if self._images:
+            with open(os.path.join(self.path, PATHS_FILE), 'a', encoding='utf-8') as f:
+                f.writelines(p + '\n' for p in self._paths)
+            with open(os.path.join(self.path, IMAGES_FILE), 'ab') as f:
+                f.write(np.array(self._images, dtype=IMAGE_DTYPE).tobytes())
+            self._images = []
+            self._paths = []
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _write_meta(path):
+    meta_path = os.path.join(path, META_FILE)
+    if os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != STORE_VERSION:
+            raise ValueError(f"不支持的存储版本: {meta.get('version')}")
+        return
+    meta = {
+        'version': STORE_VERSION,
+        'detection_dtype': DETECTION_DTYPE.descr,
+        'image_dtype': IMAGE_DTYPE.descr
+    }
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+
+
+def _recover(path):
+    """
+    截掉上次崩溃留下的未提交数据，返回下一个图片 ID
+
+    images.bin 中完整的行数即已提交的图片数；detections.bin 中图片 ID 不小于它的行
+    （检测缓冲写满时提前写入、或 flush 写完检测后崩溃）和 paths.txt 中多出的行都会被截掉，
+    否则下次追加会重用这些图片 ID，破坏 image_detections 依赖的按图片 ID 有序。
+    """
+    images_path = os.path.join(path, IMAGES_FILE)
+    if not os.path.exists(images_path):
+        for name in (DETECTIONS_FILE, PATHS_FILE):
+            if os.path.exists(os.path.join(path, name)):
+                os.truncate(os.path.join(path, name), 0)
+        return 0
+    count = os.path.getsize(images_path) // IMAGE_DTYPE.itemsize
+    os.truncate(images_path, count * IMAGE_DTYPE.itemsize)
+
+    detections_path = os.path.join(path, DETECTIONS_FILE)
+    if os.path.exists(detections_path):
+        rows = os.path.getsize(detections_path) // DETECTION_DTYPE.itemsize
+        keep = 0
+        if rows:
+            ids = np.memmap(detections_path, dtype=DETECTION_DTYPE, mode='r', shape=(rows,))['image_id']
+            keep = int(np.searchsorted(ids, count, 'left'))
+            del ids
+        os.truncate(detections_path, keep * DETECTION_DTYPE.itemsize)
+
+    paths_path = os.path.join(path, PATHS_FILE)
+    if os.path.exists(paths_path):
+        size = 0
+        with open(paths_path, 'rb') as f:
+            for _ in range(count):
+                line = f.readline()
+                if not line.endswith(b'\n'):
+                    break
+                size += len(line)
+        os.truncate(paths_path, size)
+    return count
+
+
+def _memmap(path, dtype):
+    if not os.path.exists(path) or os.path.getsize(path) < dtype.itemsize:
+        return np.empty(0, dtype=dtype)
+    count = os.path.getsize(path) // dtype.itemsize
+    return np.memmap(path, dtype=dtype, mode='r', shape=(count,))
+
+
+class StoredDetections:
+    """只读的检测结果存储视图，数据通过 np.memmap 按需读取"""
+
+    def __init__(self, path, chunk_size=1 << 20):
+        """
+        Args:
+            path: DetectionStore 写入的目录
+            chunk_size: 查询时每次处理的检测数
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.detections = _memmap(os.path.join(path, DETECTIONS_FILE), DETECTION_DTYPE)
+        self.images = _memmap(os.path.join(path, IMAGES_FILE), IMAGE_DTYPE)
+        self._paths = None
+
+    def __len__(self):
+        return len(self.detections)
+
+    @property
+    def paths(self):
+        """图片路径列表（按图片 ID 索引，首次访问时读取）"""
+        if self._paths is None:
+            with open(os.path.join(self.path, PATHS_FILE), 'r', encoding='utf-8') as f:
+                self._paths = f.read().splitlines()
+        return self._paths
+
+    def _chunks(self):
+        for start in range(0, len(self.detections), self.chunk_size):
+            yield self.detections[start:start + self.chunk_size]
+
+    def class_counts(self, labels=None, min_confidence=0.0):
+        """
+        各类别的检测数量
+
+        Returns:
+            {类别名或 ID: 数量}，按数量降序
+        """
+        counts = np.zeros(0, dtype=np.int64)
+        for chunk in self._chunks():
+            ids = chunk['class_id'][chunk['confidence'] >= min_confidence] if min_confidence else chunk['class_id']
+            chunk_counts = np.bincount(ids)
+            if len(chunk_counts) > len(counts):
+                counts = np.pad(counts, (0, len(chunk_counts) - len(counts)))
+            counts[:len(chunk_counts)] += chunk_counts
+        order = np.argsort(-counts, kind='stable')
+        return {(labels[i] if labels is not None else int(i)): int(counts[i]) for i in order if counts[i]}
+
+    def confidence_histogram(self, bins=10, class_id=None):
+        """
+        置信度直方图
+
+        Returns:
+            (counts, bin_edges)
+        """
+        edges = np.linspace(0.0, 1.0, bins + 1)
+        counts = np.zeros(bins, dtype=np.int64)
+        for chunk in self._chunks():
+            conf = chunk['confidence'] if class_id is None else chunk['confidence'][chunk['class_id'] == class_id]
+            counts += np.histogram(conf, edges)[0]
+        return counts, edges
+
+    def select(self, class_id=None, min_confidence=None):
+        """按类别 / 最低置信度筛选检测，返回结构化数组（只复制匹配的行）"""
+        parts = []
+        for chunk in self._chunks():
+            mask = np.ones(len(chunk), dtype=bool)
+            if class_id is not None:
+                mask &= chunk['class_id'] == class_id
+            if min_confidence is not None:
+                mask &= chunk['confidence'] >= min_confidence
+            parts.append(chunk[mask])
+        return np.concatenate(parts) if parts else np.empty(0, dtype=DETECTION_DTYPE)
+
+    def image_detections(self, image_id):
+        """
+        一张图片的检测结果
+
+        检测按图片 ID 顺序追加，用二分查找定位，不扫描全部数据。
+        """
+        ids = self.detections['image_id']
+        lo = np.searchsorted(ids, image_id, 'left')
+        hi = np.searchsorted(ids, image_id, 'right')
+        return np.array(self.detections[lo:hi])
+
+
+def open_store(path):
+    """打开已写入的检测结果存储"""
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        raise FileNotFoundError(f"不是检测结果存储目录: {path}")
+    return StoredDetections(path)
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+NumPy 非极大值抑制
+支持按类别抑制（不同类别的框互不抑制）、按类别设置置信度和 IoU 阈值、
+限制每张图片的最大检测数，以及多张图片一次调用的批量 NMS
+"""
+
+import numpy as np
+
+CONFIDENCE = 0.5
+THRESHOLD = 0.4
+NMS_BLOCK = 128  # 分块 NMS 每块的候选框数
+
+
+def _iou(x1, y1, x2, y2, areas, rows, cols):
+    """
+    rows 与 cols 两组框之间的 IoU 矩阵
+
+    两个框面积都为 0 时 IoU 记为 1，与 OpenCV 的 rectOverlap（jaccardDistance）一致，
+    退化框（宽或高为 0）之间的抑制结果与 cv.dnn.NMSBoxes 相同。
+    """
+    w = np.minimum(x2[rows, None], x2[None, cols]) - np.maximum(x1[rows, None], x1[None, cols])
+    h = np.minimum(y2[rows, None], y2[None, cols]) - np.maximum(y1[rows, None], y1[None, cols])
+    np.clip(w, 0, None, out=w)
+    np.clip(h, 0, None, out=h)
+    inter = w * h
+    total = areas[rows, None] + areas[None, cols]
+    iou = np.ones_like(inter)
+    np.divide(inter, total - inter, out=iou, where=total > 0)
+    return iou
+
+
+def _matrix_nms(x1, y1, x2, y2, areas, iou_thresholds, idx):
+    """
+    矩阵 NMS（Cluster-NMS 迭代），结果与贪心 NMS 完全一致
+
+    一次算出 IoU 矩阵，再迭代“被任一保留框抑制”直到不再变化，
+    迭代次数为抑制链的深度，通常只有几次。
+
+    Args:
+        idx: 参与抑制的行号，已按得分降序
+
+    Returns:
+        保留的行号
+    """
+    # suppress[i, j]: 得分更高的 i 保留时会抑制 j
+    suppress = np.triu(_iou(x1, y1, x2, y2, areas, idx, idx) > iou_thresholds[idx, None], k=1)
+    keep = np.ones(len(idx), dtype=bool)
+    while True:
+        new_keep = ~suppress[keep].any(axis=0)
+        if np.array_equal(new_keep, keep):
+            return idx[keep]
+        keep = new_keep
+
+
+def _blockwise_nms(x1, y1, x2, y2, areas, iou_thresholds, block=NMS_BLOCK):
+    """
+    单组分块 NMS，输入已按得分降序排列
+
+    每块先用之前已保留的框一次性抑制，再对块内剩余的框做矩阵 NMS。
+    之前的保留框已经确定，所以结果与逐个处理的贪心 NMS 一致，
+    但 Python 循环次数只有 N / block 次，而不是保留框的个数。
+
+    Returns:
+        保留的行号
+    """
+    kept = np.empty(0, dtype=np.int64)
+    for start in range(0, len(x1), block):
+        idx = np.arange(start, min(start + block, len(x1)))
+        if kept.size:
+            iou = _iou(x1, y1, x2, y2, areas, idx, kept)
+            idx = idx[~(iou > iou_thresholds[kept][None, :]).any(axis=1)]
+        if idx.size > 1:
+            idx = _matrix_nms(x1, y1, x2, y2, areas, iou_thresholds, idx)
+        kept = np.concatenate((kept, idx))
+    return kept
+
+
+def nms(boxes, scores, iou_threshold=THRESHOLD, groups=None, iou_thresholds=None):
+    """
+    NMS，只在同一组内抑制，结果与贪心 NMS（cv.dnn.NMSBoxes）一致
+
+    按 (组, 得分降序) 排序后对每组的连续区间分别做分块 NMS，
+    计算量只随每组内的框数平方增长，批量 NMS 的图片数增加时按线性增长。
+
+    Args:
+        boxes: (N, 4) 的 [x, y, w, h]
+        scores: (N,) 得分
+        iou_threshold: IoU 阈值，重叠大于该值的低分框被抑制
+        groups: (N,) 组号（类别、图片或二者组合），为 None 时所有框为一组
+        iou_thresholds: (N,) 每个框作为保留框时使用的 IoU 阈值，覆盖 iou_threshold
+
+    Returns:
+        保留框的下标，按得分降序
+    """
+    n = len(scores)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32)
+    if iou_thresholds is None:
+        iou_thresholds = np.full(n, iou_threshold)
+    if groups is None:
+        groups = np.zeros(n, dtype=np.int64)
+    groups = np.asarray(groups, dtype=np.int64)
+
+    order = np.lexsort((-scores, groups))
+    b = boxes[order]
+    x1, y1 = b[:, 0], b[:, 1]
+    x2, y2 = x1 + b[:, 2], y1 + b[:, 3]
+    areas = b[:, 2] * b[:, 3]
+    thresholds = np.asarray(iou_thresholds, dtype=np.float32)[order]
+
+    sorted_groups = groups[order]
+    bounds = np.flatnonzero(np.diff(sorted_groups)) + 1
+    kept = []
+    for start, end in zip(np.concatenate(([0], bounds)), np.concatenate((bounds, [n]))):
+        if end - start == 1:
+            kept.append(np.array([start], dtype=np.int64))
+            continue
+        sl = slice(start, end)
+        kept.append(start + _blockwise_nms(x1[sl], y1[sl], x2[sl], y2[sl], areas[sl], thresholds[sl]))
+    keep = order[np.concatenate(kept)]
+    return keep[np.argsort(-scores[keep], kind='stable')]
+
+
+class NmsEngine:
+    """按类别阈值过滤 + (按类别) NMS + 最大检测数"""
+
+    def __init__(self, num_classes, class_aware=True, class_confidences=None, class_thresholds=None,
+                 max_detections=None):
+        """
+        Args:
+            num_classes: 类别数
+            class_aware: 是否只在同类别之间抑制
+            class_confidences: {类别 ID: 置信度阈值}，未列出的类别使用调用时的 confidence
+            class_thresholds: {类别 ID: IoU 阈值}，未列出的类别使用调用时的 threshold
+            max_detections: 每张图片最多保留的检测数（按得分），为 None 时不限制
+        """
+        self.num_classes = num_classes
+        self.class_aware = class_aware
+        self.class_confidences = dict(class_confidences or {})
+        self.class_thresholds = dict(class_thresholds or {})
+        self.max_detections = max_detections
+
+    def min_confidence(self, confidence=CONFIDENCE):
+        """解码时使用的最低置信度（所有类别阈值中的最小值）"""
+        return min([confidence, *self.class_confidences.values()])
+
+    def state(self):
+        """影响结果的全部设置（可 JSON 序列化，键顺序固定），用于结果缓存键"""
+        return {
+            'class_aware': self.class_aware,
+            'class_confidences': sorted((int(k), float(v)) for k, v in self.class_confidences.items()),
+            'class_thresholds': sorted((int(k), float(v)) for k, v in self.class_thresholds.items()),
+            'max_detections': self.max_detections
+        }
+
+    def _per_class(self, overrides, default):
+        table = np.full(self.num_classes, default, dtype=np.float32)
+        for class_id, value in overrides.items():
+            table[class_id] = value
+        return table
+
+    def __call__(self, boxes, scores, classIDs, confidence=CONFIDENCE, threshold=THRESHOLD, image_ids=None):
+        """
+        Args:
+            boxes: (N, 4) 的 [x, y, w, h]
+            scores: (N,) 置信度
+            classIDs: (N,) 类别 ID
+            confidence: 默认置信度阈值
+            threshold: 默认 IoU 阈值
+            image_ids: (N,) 图片编号，批量 NMS 时不同图片的框互不抑制
+
+        Returns:
+            保留框的下标（每张图片内按得分降序）
+        """
+        scores = np.asarray(scores, dtype=np.float32)
+        classIDs = np.asarray(classIDs, dtype=np.int64)
+
+        candidates = np.flatnonzero(scores > self._per_class(self.class_confidences, confidence)[classIDs])
+        if not candidates.size:
+            return candidates
+
+        ids = classIDs[candidates]
+        groups = np.zeros(len(candidates), dtype=np.int64)
+        if self.class_aware:
+            groups += ids
+        if image_ids is not None:
+            groups += np.asarray(image_ids, dtype=np.int64)[candidates] * self.num_classes
+        iou_thresholds = self._per_class(self.class_thresholds, threshold)[ids]
+
+        keep = candidates[nms(np.asarray(boxes)[candidates], scores[candidates], threshold, groups, iou_thresholds)]
+
+        # 每张图片按得分排序，截取前 max_detections 个
+        images = (np.zeros(len(keep), dtype=np.int64) if image_ids is None
+                  else np.asarray(image_ids, dtype=np.int64)[keep])
+        order = np.lexsort((-scores[keep], images))
+        keep, images = keep[order], images[order]
+        if self.max_detections is not None and len(keep):
+            starts = np.flatnonzero(np.concatenate(([True], images[1:] != images[:-1])))
+            rank = np.arange(len(keep)) - np.repeat(starts, np.diff(np.append(starts, len(keep))))
+            keep = keep[rank < self.max_detections]
+        return keep
+
+
+def parse_class_values(spec, labels):
+    """
+    解析 "person=0.6,car=0.4" 形式的按类别参数
+
+    Returns:
+        {类别 ID: 数值}
+
+    Raises:
+        ValueError: 格式错误、未知类别或数值无效
+    """
+    values = {}
+    if not spec:
+        return values
+    for item in spec.split(','):
+        name, sep, value = item.partition('=')
+        name = name.strip()
+        if not sep or not name:
+            raise ValueError(f"格式错误: '{item}'，应为 类别=数值，如 person=0.6")
+        if name not in labels:
+            raise ValueError(f"未知类别: {name}")
+        try:
+            values[labels.index(name)] = float(value)
+        except ValueError:
+            raise ValueError(f"无效数值: '{item}'") from None
+    return values
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+网络原始输出的录制与重放
+录制时把每张图片的 layerOutputs（拼接为 (N, 85) 的行）追加写入原始二进制文件，
+并记录图片尺寸、letterbox 参数和推理时间；重放时通过 np.memmap 读取，
+不需要权重文件和前向，即可按磁盘速度对解码、NMS 和分析做性能测试与回归测试
+"""
+
+import json
+import os
+
+import numpy as np
+
+from yolo_detector import DetectionPostprocessor, labelsPath, CONFIDENCE, THRESHOLD
+
+OUTPUTS_FILE = 'outputs.bin'
+INDEX_FILE = 'index.bin'
+PATHS_FILE = 'paths.txt'
+META_FILE = 'recording.json'
+RECORDING_VERSION = 1
+
+INDEX_DTYPE = np.dtype([
+    ('offset', '<i8'),          # 在 outputs.bin 中的起始行
+    ('rows', '<i4'),
+    ('width', '<i4'),
+    ('height', '<i4'),
+    ('input_size', '<i4'),
+    ('scale', '<f4'),           # letterbox 缩放比例，NaN 表示拉伸预处理
+    ('dx', '<i4'),
+    ('dy', '<i4'),
+    ('inference_time', '<f4'),
+])
+
+
+class OutputRecorder:
+    """把原始网络输出追加写入录制目录（单线程写入）"""
+
+    def __init__(self, path, detector, dtype='float32', min_score=0.0):
+        """
+        Args:
+            path: 录制目录，已存在时在末尾追加
+            detector: YoloDetector，记录模型标识和输出列数
+            dtype: 'float32' 无损；'float16' 文件减半，阈值附近的框可能与原始结果略有差异
+            min_score: 只保存最高类别得分大于该值的行，文件大幅缩小；
+                       重放时置信度阈值不低于 min_score 的结果与原始结果一致
+        """
+        self.path = path
+        self.min_score = min_score
+        self.dtype = np.dtype(dtype)
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = os.path.join(path, META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta['version'] != RECORDING_VERSION or meta['dtype'] != self.dtype.str:
+                raise ValueError(f"录制目录格式不一致: {path}")
+            self.min_score = max(self.min_score, meta['min_score'])
+        meta = {
+            'version': RECORDING_VERSION,
+            'model_id': detector.model_id,
+            'letterbox': detector.letterbox,
+            'columns': 5 + len(detector.labels),
+            'dtype': self.dtype.str,
+            'min_score': self.min_score
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+
+        outputs_path = os.path.join(path, OUTPUTS_FILE)
+        row_bytes = meta['columns'] * self.dtype.itemsize
+        self.rows = os.path.getsize(outputs_path) // row_bytes if os.path.exists(outputs_path) else 0
+        self._outputs = open(outputs_path, 'ab')
+        self._index = open(os.path.join(path, INDEX_FILE), 'ab')
+        self._paths = open(os.path.join(path, PATHS_FILE), 'a', encoding='utf-8')
+
+    def add(self, image_path, layerOutputs, W, H, letterbox=None, input_size=None, inference_time=0.0):
+        """记录一张图片的前向输出"""
+        detections = np.concatenate([out.reshape(-1, out.shape[-1]) for out in layerOutputs])
+        if self.min_score > 0:
+            detections = detections[detections[:, 5:].max(axis=1) > self.min_score]
+        self._outputs.write(detections.astype(self.dtype, copy=False).tobytes())
+
+        scale, dx, dy = letterbox if letterbox is not None else (np.nan, 0, 0)
+        entry = np.array([(self.rows, len(detections), W, H, input_size or 0, scale, dx, dy, inference_time)],
+                         dtype=INDEX_DTYPE)
+        self._index.write(entry.tobytes())
+        self._paths.write(image_path + '\n')
+        self.rows += len(detections)
+
+    def close(self):
+        for f in (self._outputs, self._index, self._paths):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class Recording:
+    """只读的录制目录，原始输出通过 np.memmap 按需读取"""
+
+    def __init__(self, path):
+        meta_path = os.path.join(path, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"不是录制目录: {path}")
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            self.meta = json.load(f)
+
+        self.path = path
+        dtype = np.dtype(self.meta['dtype'])
+        columns = self.meta['columns']
+        outputs_path = os.path.join(path, OUTPUTS_FILE)
+        total_rows = os.path.getsize(outputs_path) // (columns * dtype.itemsize)
+        self.outputs = (np.memmap(outputs_path, dtype=dtype, mode='r', shape=(total_rows, columns))
+                        if total_rows else np.empty((0, columns), dtype=dtype))
+
+        index_path = os.path.join(path, INDEX_FILE)
+        count = os.path.getsize(index_path) // INDEX_DTYPE.itemsize
+        self.index = (np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(count,))
+                      if count else np.empty(0, dtype=INDEX_DTYPE))
+        with open(os.path.join(path, PATHS_FILE), 'r', encoding='utf-8') as f:
+            self.paths = f.read().splitlines()[:count]
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        """
+        Returns:
+            (image_path, layerOutputs, W, H, letterbox, input_size, inference_time)
+        """
+        entry = self.index[i]
+        start = int(entry['offset'])
+        rows = self.outputs[start:start + int(entry['rows'])]
+        if rows.dtype != np.float32:
+            rows = rows.astype(np.float32)
+        letterbox = None
+        if not np.isnan(entry['scale']):
+            letterbox = (float(entry['scale']), int(entry['dx']), int(entry['dy']))
+        return (self.paths[i], [rows], int(entry['width']), int(entry['height']), letterbox,
+                int(entry['input_size']), float(entry['inference_time']))
+
+
+class ReplayDetector(DetectionPostprocessor):
+    """
+    重放后端：不加载网络，检测结果来自录制的原始输出
+
+    解码、NMS、make_result、draw 与 YoloDetector 共用 DetectionPostprocessor，可直接交给 handle_detection。
+    """
+
+    def __init__(self, recording_path, labels_path=labelsPath, nms=None, classes=None):
+        self.recording = Recording(recording_path)
+        meta = self.recording.meta
+        input_size = int(self.recording.index[0]['input_size']) if len(self.recording) else 0
+        super().__init__(labels_path, input_size, meta['letterbox'], nms, classes)
+        self.model_id = meta['model_id']
+        self.load_timings = {}
+
+    def __len__(self):
+        return len(self.recording)
+
+    def check_confidence(self, confidence=CONFIDENCE):
+        """
+        检查置信度阈值是否适用于该录制
+
+        Raises:
+            ValueError: 录制时用 min_score 丢弃了低分行，阈值（按类别阈值取最低值）低于它时结果不完整
+        """
+        confidence_floor = self.nms.min_confidence(confidence) if self.nms is not None else confidence
+        min_score = self.recording.meta['min_score']
+        if confidence_floor < min_score:
+            raise ValueError(f"录制时只保存了得分 > {min_score} 的行，置信度阈值 {confidence_floor} 的结果不完整，"
+                             f"请使用不低于 {min_score} 的阈值")
+
+    def detect_record(self, i, confidence=CONFIDENCE, threshold=THRESHOLD):
+        """
+        对第 i 条录制记录做后处理（调用前先用 check_confidence 检查阈值）
+
+        Returns:
+            (image_path, 检测结果字典)
+        """
+        image_path, layerOutputs, W, H, letterbox, input_size, inference_time = self.recording[i]
+        self.input_size = input_size
+        boxes, confidences, classIDs = self.postprocess(layerOutputs, W, H, confidence, threshold, letterbox)
+        return image_path, self.make_result(boxes, confidences, classIDs, inference_time)
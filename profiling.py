@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+分阶段计时与性能剖析
+为每张图片记录解码、预处理、前向、后处理、绘制、保存、分析等阶段耗时，
+可选读取 net.getPerfProfile() 的逐层耗时，并通过钩子函数把记录交给外部收集器。
+未启用时 span() 返回共享的空上下文，开销可以忽略
+"""
+
+import contextlib
+import json
+import threading
+import time
+
+import cv2 as cv
+
+_NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    """计时上下文，退出时把耗时记入 profiler"""
+
+    __slots__ = ('profiler', 'name', 'start')
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class StageProfiler:
+    """按图片收集各阶段耗时"""
+
+    def __init__(self, enabled=True, layers=False, hooks=None):
+        """
+        Args:
+            enabled: 是否计时，False 时所有方法都是空操作
+            layers: 是否在每次前向后读取逐层耗时（net.getPerfProfile）
+            hooks: 回调函数列表，每张图片结束时以记录字典调用 hook(record)
+        """
+        self.enabled = enabled
+        self.layers = enabled and layers
+        self.hooks = list(hooks or [])
+        self.current = {}
+        self.current_layers = None
+        self.totals = {}        # 阶段 -> [次数, 总耗时, 最大耗时]
+        self.layer_totals = {}  # 层名 -> 总耗时
+        self.images = 0
+
+    def add_hook(self, hook):
+        """注册回调，hook(record) 在每张图片结束时调用"""
+        self.hooks.append(hook)
+
+    def span(self, name):
+        """
+        阶段计时上下文
+
+        用法:
+            with profiler.span('decode'):
+                img = cv.imread(path)
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, duration):
+        """记录在外部测得的阶段耗时（秒），同名阶段累加"""
+        if not self.enabled:
+            return
+        self.current[name] = self.current.get(name, 0.0) + duration
+
+    def record_layers(self, net):
+        """读取上一次前向的逐层耗时"""
+        if not self.layers:
+            return
+        _, layer_ticks = net.getPerfProfile()
+        freq = cv.getTickFrequency()
+        self.current_layers = {
+            name: ticks / freq
+            for name, ticks in zip(net.getLayerNames(), layer_ticks.ravel().tolist())
+            if ticks > 0
+        }
+
+    def finish(self, image_path=None):
+        """
+        结束一张图片：汇总当前记录并调用钩子
+
+        Returns:
+            记录字典 {'image', 'timestamp', 'spans', 'total'[, 'layers']}，未启用时返回 None
+        """
+        if not self.enabled:
+            return None
+
+        record = {
+            'image': image_path,
+            'timestamp': time.time(),
+            'spans': self.current,
+            'total': sum(self.current.values())
+        }
+        if self.current_layers is not None:
+            record['layers'] = self.current_layers
+            for name, value in self.current_layers.items():
+                self.layer_totals[name] = self.layer_totals.get(name, 0.0) + value
+
+        for name, value in self.current.items():
+            stats = self.totals.setdefault(name, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += value
+            stats[2] = max(stats[2], value)
+        self.images += 1
+
+        self.current = {}
+        self.current_layers = None
+        for hook in self.hooks:
+            hook(record)
+        return record
+
+    def summary(self):
+        """各阶段汇总 {阶段: {'count', 'total', 'avg', 'max'}}"""
+        return {
+            name: {'count': count, 'total': total, 'avg': total / count, 'max': peak}
+            for name, (count, total, peak) in self.totals.items()
+        }
+
+    def print_summary(self, top_layers=10):
+        """打印各阶段耗时和最慢的若干层"""
+        if not self.enabled or not self.images:
+            return
+        summary = self.summary()
+        grand_total = sum(s['total'] for s in summary.values())
+
+        print(f"\n[阶段耗时] 共 {self.images} 张图片")
+        print(f"  {'阶段':<14} {'平均 ms':>10} {'最大 ms':>10} {'占比':>8}")
+        for name, s in sorted(summary.items(), key=lambda item: -item[1]['total']):
+            share = s['total'] / grand_total if grand_total > 0 else 0
+            print(f"  {name:<14} {s['avg']*1000:>10.2f} {s['max']*1000:>10.2f} {share:>8.1%}")
+
+        if self.layer_totals:
+            layer_total = sum(self.layer_totals.values())
+            print(f"\n[逐层耗时] 最慢的 {top_layers} 层")
+            slowest = sorted(self.layer_totals.items(), key=lambda item: -item[1])[:top_layers]
+            for name, total in slowest:
+                print(f"  {name:<14} {total/self.images*1000:>10.2f} ms {total/layer_total:>8.1%}")
+
+
+class JsonlHook:
+    """把每张图片的记录追加写入 JSON Lines 文件，可作为 StageProfiler 的钩子"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, ensure_ascii=False)
+        with self.lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+# 未启用剖析时使用的共享实例
+NULL_PROFILER = StageProfiler(enabled=False)
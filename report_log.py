@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+追加写入的检测报告日志 (JSON Lines)
+每张图片一行，按条数缓冲后追加写入，可按大小轮转；
+读取时流式遍历所有分段，重建 compare_with_history 所需的汇总，
+写入开销与运行时长无关，进程崩溃最多丢失未刷新的缓冲
+"""
+
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+
+
+class ReportWriter:
+    """追加写入的 JSONL 报告"""
+
+    def __init__(self, path, flush_every=1, max_bytes=None, backup_count=None, fsync=False, max_age=None):
+        """
+        Args:
+            path: 日志文件路径
+            flush_every: 每缓冲多少条记录写入一次（1 表示每张图片写入）
+            max_bytes: 当前文件超过该大小时轮转为 path.1, path.2, ...（编号越大越新），为 None 时不轮转
+            backup_count: 最多保留的轮转分段数，超出时删除最旧的，为 None 时全部保留
+            fsync: 每次写入后是否 fsync（更安全，但更慢）
+            max_age: 当前文件写入超过该秒数后轮转，为 None 时不按时间轮转
+        """
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.fsync = fsync
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        self._buffer = []
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+
+    def _open(self):
+        """打开当前分段，新文件先写入表头（见 header）"""
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._opened = time.time()
+        header = self.header()
+        if header and self._file.tell() == 0:
+            self._file.write(header + '\n')
+            self._file.flush()
+
+    def header(self):
+        """每个分段开头的一行，JSONL 没有表头"""
+        return None
+
+    def encode(self, record):
+        """记录编码为一行文本"""
+        return json.dumps(record, ensure_ascii=False)
+
+    def write(self, record):
+        """追加一条记录"""
+        line = self.encode(record)
+        with self.lock:
+            self._buffer.append(line)
+            if len(self._buffer) >= self.flush_every:
+                self._flush()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        self._file.write('\n'.join(self._buffer) + '\n')
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self._buffer = []
+
+        if ((self.max_bytes and self._file.tell() >= self.max_bytes) or
+                (self.max_age and time.time() - self._opened >= self.max_age)):
+            self._rotate()
+
+    def _rotate(self):
+        self._file.close()
+        segments = report_segments(self.path)[:-1]
+        next_index = _segment_index(segments[-1]) + 1 if segments else 1
+        os.replace(self.path, f"{self.path}.{next_index}")
+
+        if self.backup_count is not None:
+            segments = report_segments(self.path)
+            for old in segments[:max(0, len(segments) - self.backup_count)]:
+                os.remove(old)
+
+        self._open()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+def _segment_index(path):
+    return int(path.rsplit('.', 1)[1])
+
+
+def report_segments(path):
+    """按时间顺序返回所有分段：path.1, path.2, ..., path"""
+    rotated = [p for p in glob.glob(glob.escape(path) + '.*') if p.rsplit('.', 1)[1].isdigit()]
+    rotated.sort(key=_segment_index)
+    if os.path.exists(path):
+        rotated.append(path)
+    return rotated
+
+
+def iter_report(path):
+    """
+    流式读取所有分段中的记录
+
+    崩溃时可能残留半行，无法解析的行直接跳过。
+    """
+    for segment in report_segments(path):
+        with open(segment, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+def load_report(path, history_size=2):
+    """
+    流式重放报告日志，重建分析器
+
+    Args:
+        path: 日志文件路径
+        history_size: 保留的最近记录数（compare_with_history 只需要 2 条）
+
+    Returns:
+        DetectionAnalyzer，stats 为全程汇总
+    """
+    from detection_analyzer import DetectionAnalyzer
+
+    analyzer = DetectionAnalyzer(history_size=history_size)
+    for record in iter_report(path):
+        analyzer.replay_record(record)
+    return analyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description='汇总检测报告日志')
+    parser.add_argument('report', type=str, help='报告日志路径 (JSONL)')
+    args = parser.parse_args()
+
+    if not report_segments(args.report):
+        print(f"❌ 报告日志不存在: {args.report}")
+        return
+
+    analyzer = load_report(args.report)
+    analyzer.print_summary()
+    analyzer.compare_with_history()
+
+
+if __name__ == "__main__":
+    main()
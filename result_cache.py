@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+按内容寻址的检测结果缓存
+键为图片内容哈希 + 模型标识 + 输入尺寸/预处理 + 阈值，命中时直接返回保存的检测结果，
+不经过网络前向；缓存目录按总大小做 LRU 淘汰
+"""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+
+CACHE_VERSION = 1
+
+
+def cache_key(image_bytes, model_id, input_size, letterbox, confidence, threshold, extra=None):
+    """
+    计算缓存键
+
+    Args:
+        image_bytes: 图片文件内容
+        model_id: 模型标识（cfg + 权重哈希，见 model_loader.model_identity）
+        input_size: 网络输入尺寸
+        letterbox: 是否 letterbox 预处理
+        confidence: 置信度阈值
+        threshold: NMS 阈值
+        extra: 其他影响结果的参数（如分块参数），需可 JSON 序列化
+
+    Returns:
+        sha256 十六进制字符串
+    """
+    h = hashlib.sha256(image_bytes)
+    params = {
+        'version': CACHE_VERSION,
+        'model': model_id,
+        'input_size': input_size,
+        'letterbox': letterbox,
+        'confidence': confidence,
+        'threshold': threshold,
+        'extra': extra
+    }
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+class ResultCache:
+    """磁盘上的检测结果缓存，每个键一个 JSON 文件，按最近使用时间淘汰"""
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            cache_dir: 缓存目录
+            max_bytes: 缓存总大小上限，超出时淘汰最久未使用的条目
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # 键 -> 文件大小，按最近使用时间从旧到新排列
+        self._index = collections.OrderedDict()
+        self.total_bytes = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.json')
+
+    def _load_index(self):
+        entries = []
+        for sub in os.listdir(self.cache_dir):
+            sub_dir = os.path.join(self.cache_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if not name.endswith('.json'):
+                    continue
+                st = os.stat(os.path.join(sub_dir, name))
+                entries.append((st.st_mtime_ns, name[:-5], st.st_size))
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self.total_bytes += size
+
+    def key_for(self, image_bytes, detector, confidence, threshold, tile_options=None):
+        """按检测器当前配置计算缓存键"""
+        extra = tile_options
+        if detector.classes is not None or detector.nms is not None:
+            extra = {'tile': tile_options,
+                     'classes': detector.classes.tolist() if detector.classes is not None else None}
+            if detector.nms is not None:
+                extra['nms'] = detector.nms.state()
+        return cache_key(image_bytes, detector.model_id, detector.input_size, detector.letterbox,
+                         confidence, threshold, extra)
+
+    def get(self, key):
+        """
+        查询缓存
+
+        Returns:
+            检测结果字典，未命中时返回 None
+        """
+        with self.lock:
+            if key not in self._index:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    detection = json.load(f)
+                os.utime(path)  # 更新修改时间，重启后仍按最近使用顺序淘汰
+            except (OSError, ValueError):
+                self.total_bytes -= self._index.pop(key)
+                self.misses += 1
+                return None
+            self._index.move_to_end(key)
+            self.hits += 1
+        detection['cached'] = True
+        return detection
+
+    def put(self, key, detection):
+        """保存检测结果（写临时文件后重命名，写入中途崩溃不会留下损坏的条目）"""
+        data = json.dumps({k: v for k, v in detection.items() if k != 'cached'}).encode('utf-8')
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self.lock:
+            self.total_bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._index),
+            'bytes': self.total_bytes
+        }
+
+    def print_stats(self):
+        """打印缓存统计"""
+        s = self.stats()
+        print(f"\n[结果缓存] 命中: {s['hits']}  未命中: {s['misses']}  命中率: {s['hit_rate']:.1%}  "
+              f"淘汰: {s['evictions']}  条目: {s['entries']}  大小: {s['bytes']/1024:.1f} KB")
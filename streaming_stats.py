@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+流式统计
+在线均值/方差（Welford）、可合并的分位数草图和类别计数，
+内存占用与处理的帧数无关，多个进程/线程的统计可以合并
+"""
+
+import collections
+import math
+
+
+class RunningStats:
+    """Welford 在线均值/方差，可与其他实例合并（Chan 并行算法）"""
+
+    __slots__ = ('count', 'mean', 'm2', 'min', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def add_many(self, values):
+        """一次加入一组值（先算这一组的均值/平方和，再合并）"""
+        n = len(values)
+        if n == 0:
+            return
+        batch = RunningStats()
+        batch.count = n
+        batch.mean = sum(values) / n
+        batch.m2 = sum((v - batch.mean) ** 2 for v in values)
+        batch.min = min(values)
+        batch.max = max(values)
+        self.merge(batch)
+
+    def merge(self, other):
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        n = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / n
+        self.m2 += other.m2 + delta * delta * self.count * other.count / n
+        self.count = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        """样本方差"""
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        if self.count == 0:
+            return {'count': 0}
+        return {'count': self.count, 'mean': self.mean, 'std': self.std, 'min': self.min, 'max': self.max}
+
+
+class QuantileSketch:
+    """
+    对数分桶的分位数草图（DDSketch 思路）
+
+    每个桶覆盖 (gamma^(k-1), gamma^k]，返回值的相对误差不超过 relative_accuracy；
+    桶数超过 max_buckets 时合并最小的桶（只影响最低分位数）。
+    相同精度的草图按桶相加即可合并。
+    """
+
+    MIN_VALUE = 1e-9
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value):
+        self.count += 1
+        if value <= self.MIN_VALUE:
+            self.zero_count += 1
+            return
+        k = math.ceil(math.log(value) / self._log_gamma)
+        self.buckets[k] = self.buckets.get(k, 0) + 1
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        keys = sorted(self.buckets)
+        excess = len(keys) - self.max_buckets
+        target = keys[excess]
+        for k in keys[:excess]:
+            self.buckets[target] += self.buckets.pop(k)
+
+    def merge(self, other):
+        if other.gamma != self.gamma:
+            raise ValueError("只能合并相同精度的分位数草图")
+        for k, c in other.buckets.items():
+            self.buckets[k] = self.buckets.get(k, 0) + c
+        self.zero_count += other.zero_count
+        self.count += other.count
+        if len(self.buckets) > self.max_buckets:
+            self._collapse()
+        return self
+
+    def quantile(self, q):
+        """返回第 q 分位数 (0 <= q <= 1)，没有数据时返回 None"""
+        if self.count == 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+        for k in sorted(self.buckets):
+            seen += self.buckets[k]
+            if seen > rank:
+                return 2 * self.gamma ** k / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+
+
+class StreamingStats:
+    """检测结果的流式汇总"""
+
+    def __init__(self, relative_accuracy=0.01):
+        self.frames = 0
+        self.detections = RunningStats()      # 每帧检测数量
+        self.confidence = RunningStats()      # 每个检测框的置信度
+        self.latency = RunningStats()         # 推理时间（秒）
+        self.latency_sketch = QuantileSketch(relative_accuracy)
+        self.class_counts = collections.Counter()
+        self.confidence_levels = collections.Counter()
+
+    def update(self, confidences, class_distribution, confidence_levels, inference_time=None):
+        """
+        记录一帧
+
+        Args:
+            confidences: 置信度列表
+            class_distribution: {类别名: 数量}
+            confidence_levels: {'high': n, 'medium': n, 'low': n}
+            inference_time: 推理时间（秒）
+        """
+        self.frames += 1
+        self.detections.add(len(confidences))
+        self.confidence.add_many(confidences)
+        self.class_counts.update(class_distribution)
+        self.confidence_levels.update(confidence_levels)
+        if inference_time is not None:
+            self.latency.add(inference_time)
+            self.latency_sketch.add(inference_time)
+
+    def merge(self, other):
+        """合并另一个 StreamingStats（例如其他进程的统计）"""
+        self.frames += other.frames
+        self.detections.merge(other.detections)
+        self.confidence.merge(other.confidence)
+        self.latency.merge(other.latency)
+        self.latency_sketch.merge(other.latency_sketch)
+        self.class_counts.update(other.class_counts)
+        self.confidence_levels.update(other.confidence_levels)
+        return self
+
+    def latency_percentiles(self, quantiles=(0.5, 0.95, 0.99)):
+        """推理时间分位数 {'p50': 秒, ...}"""
+        return {f"p{round(q * 100)}": self.latency_sketch.quantile(q) for q in quantiles}
+
+    def to_dict(self):
+        return {
+            'frames': self.frames,
+            'detections_per_frame': self.detections.to_dict(),
+            'confidence': self.confidence.to_dict(),
+            'inference_time': self.latency.to_dict(),
+            'inference_time_percentiles': self.latency_percentiles(),
+            'class_counts': dict(self.class_counts.most_common()),
+            'confidence_levels': dict(self.confidence_levels)
+        }
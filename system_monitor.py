@@ -2,22 +2,629 @@
 """
 系统监控脚本 - System Monitor Script
 实时监控 CPU、内存、磁盘、网络等系统资源
+后台采样线程按固定间隔采集计数器，CPU 使用率和网络 / 磁盘每秒速率由相邻两次采样的差值计算，
+读取最新采样不阻塞，可在检测循环中每帧调用；主机名、分区、网络接口等静态信息只查询一次；
+采样可持续写入 CSV / JSONL 时间序列日志（缓冲写入，按大小和时间轮转）
 """
 
 import psutil
+import collections
+import contextlib
+import heapq
+import io
+import shutil
+import sys
+import threading
 import time
+import unicodedata
 import os
 import platform
 from datetime import datetime
 
+from report_log import ReportWriter, report_segments, iter_report
+
+SAMPLE_INTERVAL = 1.0  # 后台采样间隔（秒）
+SAMPLE_HISTORY = 300   # 环形缓冲区保留的采样数
+
+# 持续监控模式的分区（显示顺序）及对应的方法
+SECTIONS = {
+    'system': 'get_system_info',
+    'cpu': 'get_cpu_info',
+    'memory': 'get_memory_info',
+    'disk': 'get_disk_info',
+    'network': 'get_network_info',
+    'process': 'get_process_info',
+    'uptime': 'get_system_uptime'
+}
+# 各分区的最短刷新间隔（秒），未列出的分区每次刷新；磁盘和进程扫描较慢，默认降低频率
+SECTION_INTERVALS = {'disk': 10.0, 'process': 5.0}
+
+LOG_FORMATS = ('csv', 'jsonl')
+LOG_FLUSH_EVERY = 10  # 结构化日志每缓冲多少个采样写入一次
+
+
+def _cpu_busy_percent(prev, cur):
+    """由两次 cpu_times 的差值计算使用率（与 psutil.cpu_percent 的算法一致）"""
+    def total(t):
+        # guest 时间已计入 user / nice，不重复计算
+        return sum(t) - getattr(t, 'guest', 0) - getattr(t, 'guest_nice', 0)
+
+    def idle(t):
+        return t.idle + getattr(t, 'iowait', 0)
+
+    elapsed = total(cur) - total(prev)
+    if elapsed <= 0:
+        return 0.0
+    busy = elapsed - (idle(cur) - idle(prev))
+    return round(min(100.0, max(0.0, busy / elapsed * 100)), 1)
+
+
+def _delta_rate(prev, cur, field, elapsed):
+    """计数器每秒增量（计数器回绕或重置时按 0 计）"""
+    return max(0, getattr(cur, field) - getattr(prev, field)) / elapsed
+
+
+def _net_rates(prev, cur, elapsed):
+    """网络每秒收发字节数和包数"""
+    return {field: _delta_rate(prev, cur, field, elapsed)
+            for field in ('bytes_sent', 'bytes_recv', 'packets_sent', 'packets_recv')}
+
+
+def _disk_rates(prev, cur, elapsed):
+    """
+    每个磁盘设备的每秒读写字节数、IOPS 和繁忙比例（只统计两次采样中都存在的设备）
+
+    Returns:
+        {设备名: {'read_bytes', 'write_bytes', 'read_iops', 'write_iops', 'busy_percent'}}，
+        busy_percent 只在平台提供 busy_time 时存在
+    """
+    rates = {}
+    for device, counters in cur.items():
+        if device not in prev:
+            continue
+        before = prev[device]
+        rate = {
+            'read_bytes': _delta_rate(before, counters, 'read_bytes', elapsed),
+            'write_bytes': _delta_rate(before, counters, 'write_bytes', elapsed),
+            'read_iops': _delta_rate(before, counters, 'read_count', elapsed),
+            'write_iops': _delta_rate(before, counters, 'write_count', elapsed)
+        }
+        if hasattr(counters, 'busy_time'):
+            # busy_time 单位为毫秒
+            rate['busy_percent'] = min(100.0, _delta_rate(before, counters, 'busy_time', elapsed) / 10)
+        rates[device] = rate
+    return rates
+
+
+class SystemSampler:
+    """后台采样线程，最近的采样保存在环形缓冲区中"""
+
+    def __init__(self, interval=SAMPLE_INTERVAL, history=SAMPLE_HISTORY):
+        """
+        Args:
+            interval: 采样间隔（秒）
+            history: 环形缓冲区大小，超出时丢弃最旧的采样
+        """
+        self.interval = interval
+        self.samples = collections.deque(maxlen=history)
+        self.cond = threading.Condition()
+        self._prev_cpu = None
+        self._prev_per_cpu = None
+        self._prev_io = None
+        self.listeners = []  # 每个新采样在采样线程中调用 listener(sample)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """记录计数器基准并启动采样线程，第一个采样在一个间隔后产生"""
+        self._prev_cpu = psutil.cpu_times()
+        self._prev_per_cpu = psutil.cpu_times(percpu=True)
+        self._prev_io = (time.time(), psutil.net_io_counters(), psutil.disk_io_counters(perdisk=True) or {})
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            sample = self._sample()
+            with self.cond:
+                self.samples.append(sample)
+                self.cond.notify_all()
+            for listener in list(self.listeners):
+                listener(sample)
+
+    def _sample(self):
+        """
+        采集一次
+
+        Returns:
+            {'time', 'cpu_percent', 'per_cpu', 'memory', 'swap', 'disk_io', 'net_io', 'net_rates', 'disk_rates'}
+            memory / swap / net_io 为 psutil 的原始结果，disk_io 为 {设备名: 计数器}（无磁盘统计时为空），
+            net_rates / disk_rates 为自上次采样以来的每秒速率（见 _net_rates / _disk_rates）
+        """
+        now = time.time()
+        cpu = psutil.cpu_times()
+        per_cpu = psutil.cpu_times(percpu=True)
+        net_io = psutil.net_io_counters()
+        disk_io = psutil.disk_io_counters(perdisk=True) or {}
+
+        prev_time, prev_net, prev_disk = self._prev_io
+        elapsed = max(now - prev_time, 1e-6)
+        sample = {
+            'time': now,
+            'cpu_percent': _cpu_busy_percent(self._prev_cpu, cpu),
+            'per_cpu': [_cpu_busy_percent(p, c) for p, c in zip(self._prev_per_cpu, per_cpu)],
+            'memory': psutil.virtual_memory(),
+            'swap': psutil.swap_memory(),
+            'disk_io': disk_io,
+            'net_io': net_io,
+            'net_rates': _net_rates(prev_net, net_io, elapsed),
+            'disk_rates': _disk_rates(prev_disk, disk_io, elapsed)
+        }
+        self._prev_cpu = cpu
+        self._prev_per_cpu = per_cpu
+        self._prev_io = (now, net_io, disk_io)
+        return sample
+
+    def latest(self, timeout=None):
+        """
+        最新的采样
+
+        Args:
+            timeout: 还没有采样时最多等待的秒数，为 None 时一直等到第一个采样
+
+        Returns:
+            采样字典，超时时返回 None
+        """
+        with self.cond:
+            if not self.samples:
+                self.cond.wait_for(lambda: self.samples, timeout)
+            return self.samples[-1] if self.samples else None
+
+    def history(self, seconds=None):
+        """最近 seconds 秒内的采样（按时间顺序），为 None 时返回缓冲区中的全部采样"""
+        with self.cond:
+            samples = list(self.samples)
+        if seconds is not None:
+            since = time.time() - seconds
+            samples = [s for s in samples if s['time'] >= since]
+        return samples
+
+
+def active_disks():
+    """有过读写的磁盘设备（结构化日志只为这些设备建列）"""
+    counters = psutil.disk_io_counters(perdisk=True) or {}
+    return sorted(d for d, c in counters.items() if c.read_count or c.write_count)
+
+
+def sample_columns(cpu_count, disks=()):
+    """结构化日志的列名，与 sample_record 的键一致"""
+    columns = ['time', 'cpu_percent']
+    columns += [f'cpu{i}' for i in range(cpu_count)]
+    columns += ['mem_percent', 'mem_used', 'mem_available', 'swap_percent',
+                'net_sent_Bps', 'net_recv_Bps', 'net_sent_pps', 'net_recv_pps']
+    for device in disks:
+        columns += [f'{device}_read_Bps', f'{device}_write_Bps', f'{device}_read_iops',
+                    f'{device}_write_iops', f'{device}_busy_percent']
+    return columns
+
+
+def sample_record(sample, disks=()):
+    """
+    采样展平为一条只含数值的记录（缺失的设备或字段为 None）
+
+    Returns:
+        {列名: 数值}，键顺序与 sample_columns 相同
+    """
+    mem, swap, net = sample['memory'], sample['swap'], sample['net_rates']
+    record = {'time': round(sample['time'], 3), 'cpu_percent': sample['cpu_percent']}
+    for i, percent in enumerate(sample['per_cpu']):
+        record[f'cpu{i}'] = percent
+    record.update({
+        'mem_percent': mem.percent,
+        'mem_used': mem.used,
+        'mem_available': mem.available,
+        'swap_percent': swap.percent,
+        'net_sent_Bps': round(net['bytes_sent'], 1),
+        'net_recv_Bps': round(net['bytes_recv'], 1),
+        'net_sent_pps': round(net['packets_sent'], 1),
+        'net_recv_pps': round(net['packets_recv'], 1)
+    })
+    for device in disks:
+        rate = sample['disk_rates'].get(device, {})
+        for field, column in (('read_bytes', 'read_Bps'), ('write_bytes', 'write_Bps'),
+                              ('read_iops', 'read_iops'), ('write_iops', 'write_iops'),
+                              ('busy_percent', 'busy_percent')):
+            value = rate.get(field)
+            record[f'{device}_{column}'] = round(value, 1) if value is not None else None
+    return record
+
+
+def log_format(path, fmt='auto'):
+    """按扩展名推断日志格式：.csv / .jsonl 为结构化日志，其他为文本快照"""
+    if fmt != 'auto':
+        return fmt
+    ext = os.path.splitext(path)[1].lower()
+    if ext == '.csv':
+        return 'csv'
+    if ext in ('.jsonl', '.json'):
+        return 'jsonl'
+    return 'text'
+
+
+class SampleLogger(ReportWriter):
+    """
+    采样时间序列日志
+
+    每个采样一行（CSV 或 JSONL），按条数缓冲写入，可按大小和时间轮转为 path.1, path.2, ...；
+    CSV 每个分段都有表头，可直接用 pandas.read_csv / numpy.genfromtxt 读取。
+    """
+
+    def __init__(self, path, cpu_count, disks=(), fmt=None, flush_every=LOG_FLUSH_EVERY, **kwargs):
+        """
+        Args:
+            path: 日志文件路径
+            cpu_count: 逻辑核心数（每个核心一列）
+            disks: 记录速率的磁盘设备
+            fmt: 'csv' 或 'jsonl'，为 None 时按扩展名推断
+            flush_every: 每缓冲多少个采样写入一次
+            **kwargs: max_bytes / max_age / backup_count / fsync，见 ReportWriter
+        """
+        self.fmt = fmt or log_format(path)
+        if self.fmt not in LOG_FORMATS:
+            raise ValueError(f"不支持的日志格式: {self.fmt}")
+        self.disks = list(disks)
+        self.columns = sample_columns(cpu_count, self.disks)
+        if self.fmt == 'csv' and os.path.exists(path) and os.path.getsize(path):
+            # 追加到已有文件时沿用其表头，保证同一分段内的列一致
+            with open(path, 'r', encoding='utf-8') as f:
+                self.columns = f.readline().rstrip('\n').split(',')
+        self.count = 0
+        super().__init__(path, flush_every=flush_every, **kwargs)
+
+    def header(self):
+        return ','.join(self.columns) if self.fmt == 'csv' else None
+
+    def encode(self, sample):
+        record = sample_record(sample, self.disks)
+        self.count += 1
+        if self.fmt == 'jsonl':
+            return super().encode(record)
+        return ','.join('' if record.get(c) is None else str(record[c]) for c in self.columns)
+
+
+def iter_samples(path):
+    """按时间顺序流式读取所有分段中的采样记录（CSV 的值转为 float，空值为 None）"""
+    if log_format(path) != 'csv':
+        yield from iter_report(path)
+        return
+    for segment in report_segments(path):
+        with open(segment, 'r', encoding='utf-8') as f:
+            columns = f.readline().rstrip('\n').split(',')
+            for line in f:
+                values = line.rstrip('\n').split(',')
+                if len(values) != len(columns):
+                    continue  # 崩溃时残留的半行
+                yield {c: float(v) if v else None for c, v in zip(columns, values)}
+
+
+def load_samples(path):
+    """
+    读取结构化日志为列数组（需要 NumPy）
+
+    Returns:
+        {列名: float64 数组}，缺失值为 NaN，可直接传给 pandas.DataFrame
+    """
+    import numpy as np
+
+    records = list(iter_samples(path))
+    columns = list(dict.fromkeys(c for r in records for c in r))
+    return {c: np.array([np.nan if r.get(c) is None else r[c] for r in records], dtype=np.float64)
+            for c in columns}
+
+
+def _display_width(text):
+    """终端显示宽度（中文等全角字符占两列）"""
+    return sum(2 if unicodedata.east_asian_width(ch) in 'WF' else 1 for ch in text)
+
+
+def _fit_width(text, width):
+    """按显示宽度截断，避免长行折行打乱行号"""
+    if _display_width(text) <= width:
+        return text
+    used = 0
+    for i, ch in enumerate(text):
+        used += 2 if unicodedata.east_asian_width(ch) in 'WF' else 1
+        if used > width:
+            return text[:i]
+    return text
+
+
+def parse_section_intervals(spec):
+    """
+    解析 "disk=10,process=5" 形式的分区刷新间隔
+
+    Returns:
+        {分区名: 秒}
+
+    Raises:
+        ValueError: 格式错误、未知分区或间隔不是正数
+    """
+    intervals = {}
+    if not spec:
+        return intervals
+    for item in spec.split(','):
+        name, sep, value = item.partition('=')
+        name = name.strip()
+        if not sep or not name:
+            raise ValueError(f"格式错误: '{item}'，应为 分区=秒，如 disk=10")
+        if name not in SECTIONS:
+            raise ValueError(f"未知分区: {name}（可选: {', '.join(SECTIONS)}）")
+        try:
+            seconds = float(value)
+        except ValueError:
+            raise ValueError(f"无效间隔: '{item}'") from None
+        if not seconds > 0:
+            raise ValueError(f"间隔必须为正数: '{item}'")
+        intervals[name] = seconds
+    return intervals
+
+
+class TerminalRenderer:
+    """
+    增量终端渲染
+
+    每个分区按自己的刷新间隔重新生成文本，其余时间复用上次的文本；
+    与上一帧逐行比较，只用 ANSI 光标定位重写发生变化的行，不清屏、不启动子进程。
+    输出不是终端（重定向到文件）时每次输出完整的一帧，不写入控制字符。
+    """
+
+    def __init__(self, monitor, section_intervals=None, stream=None):
+        """
+        Args:
+            monitor: SystemMonitor
+            section_intervals: {分区名: 秒}，覆盖 SECTION_INTERVALS
+            stream: 输出流，默认 sys.stdout
+        """
+        self.monitor = monitor
+        self.intervals = dict(SECTION_INTERVALS)
+        self.intervals.update(section_intervals or {})
+        self.stream = stream or sys.stdout
+        self.ansi = self.stream.isatty()
+        self._sections = {}  # 分区名 -> (生成时间, 行列表)
+        self._frame = []     # 上一帧已显示的行
+        self._size = None
+        if self.ansi and os.name == 'nt':
+            os.system('')  # 启用 Windows 控制台的 ANSI 转义序列
+
+    def _section_lines(self, name, now):
+        cached = self._sections.get(name)
+        if cached is None or now - cached[0] >= self.intervals.get(name, 0):
+            buf = io.StringIO()
+            with contextlib.redirect_stdout(buf):
+                getattr(self.monitor, SECTIONS[name])()
+            cached = (now, buf.getvalue().splitlines())
+            self._sections[name] = cached
+        return cached[1]
+
+    def render(self, footer=None):
+        """
+        输出一帧
+
+        Returns:
+            实际重写的行数
+        """
+        now = time.time()
+        lines = []
+        for name in SECTIONS:
+            lines.extend(self._section_lines(name, now))
+        if footer:
+            lines.extend(['', footer])
+
+        if not self.ansi:
+            self.stream.write('\n'.join(lines) + '\n\n')
+            self.stream.flush()
+            return len(lines)
+
+        size = shutil.get_terminal_size()
+        out = []
+        if size != self._size:
+            # 首帧或终端大小变化：隐藏光标并清屏，之后全部重绘
+            out.append('\x1b[?25l\x1b[2J')
+            self._frame = []
+            self._size = size
+        lines = [_fit_width(line, size.columns - 1) for line in lines[:size.lines - 1]]
+
+        changed = 0
+        for row, line in enumerate(lines):
+            if row >= len(self._frame) or self._frame[row] != line:
+                out.append(f'\x1b[{row + 1};1H{line}\x1b[K')
+                changed += 1
+        if len(lines) < len(self._frame):
+            out.append(f'\x1b[{len(lines) + 1};1H\x1b[J')
+        self._frame = lines
+
+        if out:
+            self.stream.write(''.join(out))
+            self.stream.flush()
+        return changed
+
+    def close(self):
+        """光标移到最后一行之后并恢复显示"""
+        if self.ansi and self._size is not None:
+            self.stream.write(f'\x1b[{len(self._frame) + 1};1H\x1b[?25h')
+            self.stream.flush()
+
+
+class ProcessTracker:
+    """
+    跨刷新保留 psutil.Process 句柄的进程跟踪器
+
+    每次 update 对所有进程只读取 CPU 时间和创建时间（创建时间变化说明 PID 被重用，丢弃旧句柄），
+    cpu_percent 为与上次 update 之间的真实差值；
+    已退出的进程及时移除，父进程只在发现新进程时读取一次。
+    名称、RSS、线程数只对前 N 个进程和跟踪的进程树读取，进程数上千时开销仍然很小。
+    """
+
+    def __init__(self, follow=None):
+        """
+        Args:
+            follow: 跟踪的根进程 PID（如检测主进程），显示它及所有子进程
+        """
+        self.follow = follow
+        self.updated = None
+        self._procs = {}  # pid -> psutil.Process
+        self._ctime = {}  # pid -> 进程创建时间，识别被重用的 PID
+        self._cpu = {}    # pid -> 最近一次 cpu_percent
+        self._ppid = {}   # pid -> 父进程 pid
+
+    def update(self):
+        """刷新所有进程的 CPU 使用率（新出现的进程首次为 0.0）"""
+        pids = psutil.pids()
+        alive = set(pids)
+        for pid in [pid for pid in self._procs if pid not in alive]:
+            self._evict(pid)
+
+        for pid in pids:
+            proc = self._procs.get(pid)
+            try:
+                current = psutil.Process(pid)
+                if proc is not None and current.create_time() != self._ctime[pid]:
+                    # PID 已被新进程重用，旧句柄的 CPU 基准和父进程都不再适用
+                    self._evict(pid)
+                    proc = None
+                if proc is None:
+                    # 父进程只在发现时读取一次（重新挂靠时原父进程已退出，不影响进程树）
+                    proc = current
+                    self._ppid[pid] = proc.ppid()
+                    self._ctime[pid] = proc.create_time()
+                    self._procs[pid] = proc
+                self._cpu[pid] = proc.cpu_percent(interval=None)
+            except psutil.NoSuchProcess:
+                self._evict(pid)
+            except psutil.AccessDenied:
+                if pid in self._procs:
+                    self._cpu[pid] = 0.0
+        self.updated = time.time()
+
+    def _evict(self, pid):
+        self._procs.pop(pid, None)
+        self._cpu.pop(pid, None)
+        self._ppid.pop(pid, None)
+        self._ctime.pop(pid, None)
+
+    def __len__(self):
+        return len(self._procs)
+
+    def details(self, pid, mem_total=None):
+        """
+        单个进程的详细信息
+
+        Returns:
+            {'pid', 'name', 'cpu_percent', 'memory_percent', 'rss', 'threads', 'status'}，进程已退出时返回 None
+        """
+        proc = self._procs.get(pid)
+        if proc is None:
+            return None
+        if mem_total is None:
+            mem_total = psutil.virtual_memory().total
+        info = {'pid': pid, 'name': '?', 'cpu_percent': self._cpu.get(pid, 0.0),
+                'memory_percent': 0.0, 'rss': 0, 'threads': 0, 'status': '?'}
+        try:
+            with proc.oneshot():
+                info['name'] = proc.name()
+                info['status'] = proc.status()
+                info['rss'] = proc.memory_info().rss
+                info['threads'] = proc.num_threads()
+        except psutil.NoSuchProcess:
+            self._evict(pid)
+            return None
+        except psutil.AccessDenied:
+            pass
+        info['memory_percent'] = info['rss'] / mem_total * 100 if mem_total else 0.0
+        return info
+
+    def top(self, n=5):
+        """CPU 占用最高的 n 个进程（堆选择，不对全部进程排序）"""
+        mem_total = psutil.virtual_memory().total
+        top = heapq.nlargest(n, self._cpu.items(), key=lambda item: item[1])
+        return [info for info in (self.details(pid, mem_total) for pid, _ in top) if info is not None]
+
+    def tree(self, root=None):
+        """
+        root 及其所有子孙进程（深度优先，父进程在前）
+
+        Returns:
+            [(深度, 详细信息), ...]，root 不存在时返回空列表
+        """
+        root = self.follow if root is None else root
+        if root is None or root not in self._procs:
+            return []
+        children = collections.defaultdict(list)
+        for pid, ppid in self._ppid.items():
+            if pid != ppid:
+                children[ppid].append(pid)
+
+        mem_total = psutil.virtual_memory().total
+        result = []
+        stack = [(0, root)]
+        while stack:
+            depth, pid = stack.pop()
+            info = self.details(pid, mem_total)
+            if info is None:
+                continue
+            result.append((depth, info))
+            stack.extend((depth + 1, child) for child in sorted(children[pid], reverse=True))
+        return result
+
 
 class SystemMonitor:
     """系统监控类"""
 
-    def __init__(self):
-        self.hostname = platform.node()
-        self.system = platform.system()
-        self.release = platform.release()
+    def __init__(self, sample_interval=SAMPLE_INTERVAL, history=SAMPLE_HISTORY):
+        """
+        Args:
+            sample_interval: 后台采样间隔（秒）
+            history: 保留的采样数
+        """
+        self.static = None
+        self.refresh_static()
+        self.sampler = SystemSampler(sample_interval, history).start()
+        self.processes = ProcessTracker()
+        self.top_n = 5
+
+    def refresh_static(self):
+        """
+        重新查询静态信息（主机名、处理器、核心数、分区、网络接口地址、启动时间）
+
+        这些信息运行期间基本不变，只在创建时查询一次；挂载新分区或网卡地址变化后调用本方法刷新。
+        """
+        self.static = {
+            'hostname': platform.node(),
+            'system': platform.system(),
+            'release': platform.release(),
+            'processor': platform.processor(),
+            'cpu_count': psutil.cpu_count(logical=False),
+            'cpu_count_logical': psutil.cpu_count(logical=True),
+            'partitions': psutil.disk_partitions(),
+            'if_addrs': psutil.net_if_addrs(),
+            'boot_time': psutil.boot_time()
+        }
+        self.hostname = self.static['hostname']
+        self.system = self.static['system']
+        self.release = self.static['release']
+
+    def latest_sample(self):
+        """最新采样（仅在启动后第一个采样产生之前等待一个采样间隔）"""
+        return self.sampler.latest()
+
+    def close(self):
+        """停止后台采样线程"""
+        self.sampler.stop()
 
     def get_system_info(self):
         """获取系统基本信息"""
@@ -26,15 +633,16 @@ class SystemMonitor:
         print("=" * 60)
         print(f"主机名: {self.hostname}")
         print(f"系统: {self.system} {self.release}")
-        print(f"处理器: {platform.processor()}")
+        print(f"处理器: {self.static['processor']}")
         print("=" * 60)
 
     def get_cpu_info(self):
         """获取 CPU 信息"""
         print("\n[CPU 信息]")
-        cpu_percent = psutil.cpu_percent(interval=1, percpu=False)
-        cpu_count = psutil.cpu_count(logical=False)
-        cpu_count_logical = psutil.cpu_count(logical=True)
+        sample = self.latest_sample()
+        cpu_percent = sample['cpu_percent']
+        cpu_count = self.static['cpu_count']
+        cpu_count_logical = self.static['cpu_count_logical']
         cpu_freq = psutil.cpu_freq()
 
         print(f"  物理核心数: {cpu_count}")
@@ -44,16 +652,21 @@ class SystemMonitor:
             print(f"  CPU 频率: {cpu_freq.current:.2f} MHz")
 
         # 每个核心的使用率
-        per_cpu = psutil.cpu_percent(interval=1, percpu=True)
-        for i, percentage in enumerate(per_cpu):
+        for i, percentage in enumerate(sample['per_cpu']):
             bar = self._get_progress_bar(percentage, 20)
             print(f"  核心 {i}: {bar} {percentage}%")
 
+    def get_cpu_percent(self):
+        """非阻塞读取最新采样的 CPU 使用率（还没有采样时返回 0.0）"""
+        sample = self.sampler.latest(timeout=0)
+        return sample['cpu_percent'] if sample is not None else 0.0
+
     def get_memory_info(self):
         """获取内存信息"""
         print("\n[内存信息]")
-        mem = psutil.virtual_memory()
-        swap = psutil.swap_memory()
+        sample = self.latest_sample()
+        mem = sample['memory']
+        swap = sample['swap']
 
         print(f"  总内存: {self._bytes_to_gb(mem.total):.2f} GB")
         print(f"  已使用: {self._bytes_to_gb(mem.used):.2f} GB ({mem.percent}%)")
@@ -66,9 +679,7 @@ class SystemMonitor:
     def get_disk_info(self):
         """获取磁盘信息"""
         print("\n[磁盘信息]")
-        partitions = psutil.disk_partitions()
-
-        for partition in partitions:
+        for partition in self.static['partitions']:
             print(f"\n  设备: {partition.device}")
             print(f"  挂载点: {partition.mountpoint}")
             print(f"  文件系统: {partition.fstype}")
@@ -82,19 +693,37 @@ class SystemMonitor:
             except PermissionError:
                 print(f"  无权限访问")
 
+        # 每个设备的读写速率（跳过从未有过读写的设备，如未使用的 loop 设备）
+        sample = self.latest_sample()
+        devices = [d for d, c in sample['disk_io'].items() if c.read_count or c.write_count]
+        if devices:
+            print(f"\n  {'设备':<12} {'读取 MB/s':>10} {'写入 MB/s':>10} {'读 IOPS':>9} {'写 IOPS':>9} {'繁忙':>7}")
+            for device in devices:
+                rate = sample['disk_rates'].get(device)
+                if rate is None:
+                    continue
+                busy = f"{rate['busy_percent']:.1f}%" if 'busy_percent' in rate else '-'
+                print(f"  {device:<12} {self._bytes_to_mb(rate['read_bytes']):>10.2f} "
+                      f"{self._bytes_to_mb(rate['write_bytes']):>10.2f} {rate['read_iops']:>9.1f} "
+                      f"{rate['write_iops']:>9.1f} {busy:>7}")
+
     def get_network_info(self):
         """获取网络信息"""
         print("\n[网络信息]")
-        net_io = psutil.net_io_counters()
+        sample = self.latest_sample()
+        net_io = sample['net_io']
+        rates = sample['net_rates']
 
         print(f"  发送数据: {self._bytes_to_gb(net_io.bytes_sent):.2f} GB")
         print(f"  接收数据: {self._bytes_to_gb(net_io.bytes_recv):.2f} GB")
         print(f"  发送包数: {net_io.packets_sent:,}")
         print(f"  接收包数: {net_io.packets_recv:,}")
+        print(f"  发送速率: {self._bytes_to_mb(rates['bytes_sent']):.2f} MB/s ({rates['packets_sent']:.0f} 包/秒)")
+        print(f"  接收速率: {self._bytes_to_mb(rates['bytes_recv']):.2f} MB/s ({rates['packets_recv']:.0f} 包/秒)")
 
         # 网络接口信息
         print("\n  网络接口:")
-        addrs = psutil.net_if_addrs()
+        addrs = self.static['if_addrs']
         for interface_name, interface_addresses in addrs.items():
             print(f"\n    接口: {interface_name}")
             for address in interface_addresses:
@@ -104,32 +733,43 @@ class SystemMonitor:
                 elif str(address.family) == 'AddressFamily.AF_PACKET':
                     print(f"      MAC 地址: {address.address}")
 
-    def get_process_info(self, top_n=5):
-        """获取进程信息"""
-        print(f"\n[进程信息 - 前 {top_n} 个 CPU 占用]")
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent']):
-            try:
-                processes.append(proc.info)
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                pass
-
-        # 按 CPU 使用率排序
-        processes = sorted(processes, key=lambda x: x['cpu_percent'] or 0, reverse=True)
+    def get_process_info(self, top_n=None):
+        """获取进程信息（CPU 使用率为与上次调用之间的差值，首次调用时先建立基准）"""
+        top_n = top_n or self.top_n
+        tracker = self.processes
+        if tracker.updated is None:
+            tracker.update()
+            time.sleep(0.1)
+        tracker.update()
 
+        print(f"\n[进程信息 - 前 {top_n} 个 CPU 占用，共 {len(tracker)} 个进程]")
         print(f"  {'PID':<8} {'进程名':<25} {'CPU %':<10} {'内存 %':<10}")
         print("  " + "-" * 55)
-        for proc in processes[:top_n]:
-            pid = proc['pid']
-            name = proc['name'][:24]
-            cpu = proc['cpu_percent'] or 0
-            mem = proc['memory_percent'] or 0
-            print(f"  {pid:<8} {name:<25} {cpu:<10.1f} {mem:<10.1f}")
+        for proc in tracker.top(top_n):
+            print(f"  {proc['pid']:<8} {proc['name'][:24]:<25} {proc['cpu_percent']:<10.1f} "
+                  f"{proc['memory_percent']:<10.1f}")
+
+        if tracker.follow is not None:
+            tree = tracker.tree()
+            print(f"\n[进程树 - PID {tracker.follow}]")
+            if not tree:
+                print("  进程不存在")
+            else:
+                print(f"  {'PID':<8} {'进程名':<25} {'CPU %':>7} {'RSS MB':>9} {'线程':>5}  状态")
+                print("  " + "-" * 65)
+                total_cpu = total_rss = 0
+                for depth, proc in tree:
+                    name = ('  ' * depth + proc['name'])[:24]
+                    print(f"  {proc['pid']:<8} {name:<25} {proc['cpu_percent']:>7.1f} "
+                          f"{self._bytes_to_mb(proc['rss']):>9.1f} {proc['threads']:>5}  {proc['status']}")
+                    total_cpu += proc['cpu_percent']
+                    total_rss += proc['rss']
+                print(f"  {'合计':<31} {total_cpu:>7.1f} {self._bytes_to_mb(total_rss):>9.1f}")
 
     def get_system_uptime(self):
         """获取系统运行时间"""
         print("\n[系统运行时间]")
-        boot_time = psutil.boot_time()
+        boot_time = self.static['boot_time']
         uptime_seconds = time.time() - boot_time
         uptime_str = self._seconds_to_dhms(uptime_seconds)
 
@@ -137,17 +777,27 @@ class SystemMonitor:
         print(f"  启动时间: {boot_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"  运行时长: {uptime_str}")
 
-    def monitor_continuous(self, interval=5):
-        """持续监控模式"""
-        print("\n持续监控模式 (按 Ctrl+C 退出)")
-        print(f"刷新间隔: {interval} 秒\n")
+    def monitor_continuous(self, interval=5, section_intervals=None):
+        """
+        持续监控模式（增量渲染，只重写变化的行）
+
+        Args:
+            interval: 刷新间隔（秒），可小于 1
+            section_intervals: {分区名: 秒}，各分区的最短刷新间隔，覆盖 SECTION_INTERVALS
+        """
+        renderer = TerminalRenderer(self, section_intervals)
+        slow = ", ".join(f"{name} {seconds:g}s" for name, seconds in renderer.intervals.items())
+        footer = f"持续监控模式 (按 Ctrl+C 退出)  刷新间隔: {interval:g} 秒  慢速分区: {slow}"
 
         try:
+            deadline = time.time()
             while True:
-                os.system('clear' if os.name == 'posix' else 'cls')
-                self.display_all()
-                time.sleep(interval)
+                renderer.render(footer)
+                # 按固定节拍刷新，渲染耗时不累积到间隔中
+                deadline += interval
+                time.sleep(max(0.0, deadline - time.time()))
         except KeyboardInterrupt:
+            renderer.close()
             print("\n\n监控已停止")
 
     def display_all(self):
@@ -160,6 +810,41 @@ class SystemMonitor:
         self.get_process_info()
         self.get_system_uptime()
 
+    def log_samples(self, path, fmt=None, duration=None, flush_every=LOG_FLUSH_EVERY, max_bytes=None,
+                    max_age=None, backup_count=None):
+        """
+        持续把每个采样写入结构化日志，直到 duration 秒后或 Ctrl+C
+
+        写入在采样线程中完成，主线程只等待；采样间隔由 sample_interval 决定。
+
+        Args:
+            path: 日志文件路径（.csv / .jsonl）
+            fmt: 'csv' 或 'jsonl'，为 None 时按扩展名推断
+            duration: 记录时长（秒），为 None 时一直运行
+            flush_every: 每缓冲多少个采样写入一次
+            max_bytes: 单个分段的最大字节数，超出时轮转
+            max_age: 单个分段的最长时间（秒），超出时轮转
+            backup_count: 最多保留的轮转分段数
+        """
+        logger = SampleLogger(path, self.static['cpu_count_logical'], active_disks(), fmt,
+                              flush_every=flush_every, max_bytes=max_bytes, max_age=max_age,
+                              backup_count=backup_count)
+        print(f"结构化日志 ({logger.fmt}): {path}，采样间隔 {self.sampler.interval:g} 秒，"
+              f"{len(logger.columns)} 列 (按 Ctrl+C 停止)")
+
+        self.sampler.listeners.append(logger.write)
+        try:
+            if duration is None:
+                while True:
+                    time.sleep(3600)
+            time.sleep(duration)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.sampler.listeners.remove(logger.write)
+            logger.close()
+        print(f"\n已记录 {logger.count} 个采样到: {path}")
+
     def save_to_log(self, filename="system_monitor.log"):
         """保存监控信息到日志文件"""
         import sys
@@ -187,6 +872,10 @@ class SystemMonitor:
         """字节转 GB"""
         return bytes_value / (1024 ** 3)
 
+    def _bytes_to_mb(self, bytes_value):
+        """字节转 MB"""
+        return bytes_value / (1024 ** 2)
+
     def _get_progress_bar(self, percentage, length=20):
         """生成进度条"""
         filled = int(length * percentage / 100)
@@ -219,21 +908,62 @@ def main():
     parser = argparse.ArgumentParser(description='系统监控脚本')
     parser.add_argument('-c', '--continuous', action='store_true',
                        help='持续监控模式')
-    parser.add_argument('-i', '--interval', type=int, default=5,
-                       help='持续监控的刷新间隔（秒），默认 5 秒')
+    parser.add_argument('-i', '--interval', type=float, default=5,
+                       help='持续监控的刷新间隔（秒，可小于 1），默认 5 秒')
     parser.add_argument('-l', '--log', type=str,
-                       help='保存监控信息到日志文件')
+                       help='保存监控信息到日志文件（.csv / .jsonl 为持续结构化采样，其他扩展名为单次文本快照）')
+    parser.add_argument('--log-format', choices=['auto', 'text', 'csv', 'jsonl'], default='auto',
+                       help='日志格式 (默认: auto，按扩展名推断)')
+    parser.add_argument('--log-flush', type=int, default=LOG_FLUSH_EVERY,
+                       help=f'结构化日志每缓冲多少个采样写入一次 (默认: {LOG_FLUSH_EVERY})')
+    parser.add_argument('--log-max-mb', type=float,
+                       help='结构化日志单个文件超过该大小（MB）时轮转')
+    parser.add_argument('--log-max-minutes', type=float,
+                       help='结构化日志单个文件写入超过该分钟数时轮转')
+    parser.add_argument('--log-backups', type=int,
+                       help='结构化日志最多保留的轮转文件数 (默认: 全部保留)')
+    parser.add_argument('--duration', type=float,
+                       help='结构化日志记录时长（秒），默认一直运行直到 Ctrl+C')
     parser.add_argument('-s', '--simple', action='store_true',
                        help='简化输出（仅显示关键信息）')
+    parser.add_argument('--sample-interval', type=float, default=SAMPLE_INTERVAL,
+                       help=f'后台采样间隔（秒），CPU 使用率按相邻采样计算 (默认: {SAMPLE_INTERVAL})')
+    parser.add_argument('--top', type=int, default=5,
+                       help='进程表显示 CPU 占用最高的前 N 个进程 (默认: 5)')
+    parser.add_argument('--follow', type=int,
+                       help='跟踪该 PID 及其所有子进程（如检测主进程和工作进程），显示 CPU、RSS、线程数')
+    parser.add_argument('--section-intervals', type=str,
+                       help='持续监控时各分区的刷新间隔（秒），如 "disk=30,process=2"'
+                            '（分区: system,cpu,memory,disk,network,process,uptime；默认 disk=10,process=5）')
 
     args = parser.parse_args()
+    try:
+        section_intervals = parse_section_intervals(args.section_intervals)
+    except ValueError as e:
+        parser.error(f"--section-intervals: {e}")
 
-    monitor = SystemMonitor()
+    sample_interval = args.sample_interval
+    if args.continuous:
+        # 刷新比采样快时，按刷新间隔采样，避免重复显示同一个采样
+        sample_interval = min(sample_interval, args.interval)
+    monitor = SystemMonitor(sample_interval=sample_interval)
+    monitor.top_n = args.top
+    monitor.processes.follow = args.follow
+    if not args.simple and not (args.log and log_format(args.log, args.log_format) != 'text'):
+        # 提前建立进程 CPU 时间基准，等待首个系统采样期间即可积累差值
+        monitor.processes.update()
 
     if args.continuous:
-        monitor.monitor_continuous(args.interval)
+        monitor.monitor_continuous(args.interval, section_intervals)
     elif args.log:
-        monitor.save_to_log(args.log)
+        fmt = log_format(args.log, args.log_format)
+        if fmt == 'text':
+            monitor.save_to_log(args.log)
+        else:
+            monitor.log_samples(args.log, fmt, duration=args.duration, flush_every=args.log_flush,
+                                max_bytes=int(args.log_max_mb * 1024 * 1024) if args.log_max_mb else None,
+                                max_age=args.log_max_minutes * 60 if args.log_max_minutes else None,
+                                backup_count=args.log_backups)
     elif args.simple:
         monitor.get_system_info()
         monitor.get_cpu_info()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+阈值扫描
+每张图片只前向一次，用原始输出评估 CONFIDENCE x NMS THRESHOLD 网格：
+按最低置信度解码一次，其余置信度只是对解码结果的筛选，每个网格点只需一次 NMS
+"""
+
+import json
+
+import cv2 as cv
+
+from detection_analyzer import DetectionAnalyzer
+
+SWEEP_CONFIDENCES = (0.3, 0.4, 0.5, 0.6, 0.7)
+SWEEP_THRESHOLDS = (0.3, 0.4, 0.5, 0.6, 0.7)
+
+
+class ThresholdSweep:
+    """CONFIDENCE x NMS THRESHOLD 网格评估"""
+
+    def __init__(self, detector, confidences=SWEEP_CONFIDENCES, thresholds=SWEEP_THRESHOLDS):
+        """
+        Args:
+            detector: YoloDetector
+            confidences: 置信度阈值列表
+            thresholds: NMS 阈值列表
+        """
+        self.detector = detector
+        self.confidences = sorted(confidences)
+        self.thresholds = sorted(thresholds)
+        self.images = 0
+        self.forward_time = 0.0
+        # 每个网格点一个分析器，只保留汇总统计
+        self.analyzers = {(c, t): DetectionAnalyzer(history_size=1)
+                          for c in self.confidences for t in self.thresholds}
+
+    def add_image(self, img):
+        """对一张图片前向一次并评估所有网格点"""
+        (H, W) = img.shape[:2]
+        layerOutputs, inference_time, letterbox = self.detector.forward(img)
+        self.forward_time += inference_time
+        self.images += 1
+
+        # 输出缓冲区会在下一次前向时被覆盖，这里立即解码，解码结果是独立的数组
+        boxes, scores, classIDs = self.detector.decode(layerOutputs, W, H, self.confidences[0], letterbox)
+        self.add_decoded(boxes, scores, classIDs, inference_time)
+
+    def add_decoded(self, boxes, scores, classIDs, inference_time=None):
+        """
+        用已按最低置信度解码的结果评估所有网格点
+
+        抑制交给 detector.suppress，配置了 NmsEngine（按类别阈值 / 按类别抑制 / 最大检测数）时
+        网格结果与实际检测一致。
+        """
+        labels = self.detector.labels
+        nms = self.detector.nms
+        for c in self.confidences:
+            mask = scores > (nms.min_confidence(c) if nms is not None else c)
+            c_boxes, c_scores, c_ids = boxes[mask], scores[mask], classIDs[mask]
+            for t in self.thresholds:
+                idxs = self.detector.suppress(c_boxes, c_scores, c_ids, c, t)
+                self.analyzers[(c, t)].analyze_detection_result(
+                    c_boxes[idxs].tolist(), c_scores[idxs].tolist(), c_ids[idxs].tolist(), labels,
+                    inference_time, verbose=False)
+
+    def results(self):
+        """
+        各网格点的汇总
+
+        Returns:
+            [{'confidence', 'threshold', 'detections', 'per_image', 'avg_confidence',
+              'high_ratio', 'low_ratio', 'class_counts'}, ...]
+        """
+        rows = []
+        for (c, t), analyzer in self.analyzers.items():
+            stats = analyzer.stats
+            total = stats.confidence.count
+            levels = stats.confidence_levels
+            rows.append({
+                'confidence': c,
+                'threshold': t,
+                'detections': total,
+                'per_image': total / self.images if self.images else 0.0,
+                'avg_confidence': stats.confidence.mean if total else 0.0,
+                'high_ratio': levels['high'] / total if total else 0.0,
+                'low_ratio': levels['low'] / total if total else 0.0,
+                'class_counts': dict(stats.class_counts.most_common())
+            })
+        return rows
+
+    def print_results(self, top_classes=3):
+        """打印网格评估表"""
+        print(f"\n{'='*60}")
+        print(f"阈值扫描: {self.images} 张图片，前向 {self.images} 次，"
+              f"{len(self.confidences)}x{len(self.thresholds)} 个网格点")
+        print(f"{'='*60}")
+        print(f"  {'CONF':>5} {'NMS':>5} {'检测数':>7} {'每张':>7} {'平均置信度':>10} {'高置信度':>8}  主要类别")
+        for row in self.results():
+            top = ", ".join(f"{name} {count}" for name, count in list(row['class_counts'].items())[:top_classes])
+            print(f"  {row['confidence']:>5.2f} {row['threshold']:>5.2f} {row['detections']:>7} "
+                  f"{row['per_image']:>7.2f} {row['avg_confidence']:>10.2%} {row['high_ratio']:>8.1%}  {top}")
+        if self.images:
+            print(f"\n前向总耗时: {self.forward_time*1000:.2f} ms "
+                  f"(每张 {self.forward_time/self.images*1000:.2f} ms)")
+
+    def export(self, filename):
+        """导出网格评估结果 (JSON)"""
+        report = {
+            'images': self.images,
+            'confidences': self.confidences,
+            'thresholds': self.thresholds,
+            'forward_time': self.forward_time,
+            'results': self.results()
+        }
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\n阈值扫描结果已导出到: {filename}")
+
+
+def sweep_images(detector, image_paths, confidences=SWEEP_CONFIDENCES, thresholds=SWEEP_THRESHOLDS):
+    """
+    对一组图片做阈值扫描
+
+    Returns:
+        ThresholdSweep
+    """
+    sweep = ThresholdSweep(detector, confidences, thresholds)
+    for image_path in image_paths:
+        img = cv.imread(image_path)
+        if img is None:
+            print(f"❌ 无法读取图片: {image_path}")
+            continue
+        sweep.add_image(img)
+        print(f"[INFO] 已处理 {sweep.images}/{len(image_paths)}: {image_path}")
+    return sweep
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+大图分块检测
+将大图切成有重叠的块，所有块一次批量前向，检测框映射回全图坐标后做一次全局 NMS，
+小物体召回更好，耗时随块数线性增长
+"""
+
+import math
+
+import numpy as np
+
+from yolo_detector import CONFIDENCE, THRESHOLD
+
+TILE_SIZE = 416
+TILE_OVERLAP = 0.2
+MAX_TILES = 16
+
+
+def _axis_starts(length, tile, step):
+    """单个方向上各块的起点，最后一块贴齐边缘"""
+    if length <= tile:
+        return [0]
+    count = math.ceil((length - tile) / step) + 1
+    starts = [min(i * step, length - tile) for i in range(count)]
+    return sorted(set(starts))
+
+
+def make_tiles(W, H, tile_size=TILE_SIZE, overlap=TILE_OVERLAP, max_tiles=MAX_TILES):
+    """
+    计算分块区域
+
+    块数超过 max_tiles 时逐步放大块尺寸（前向时再缩放到网络输入尺寸），
+    保证耗时可预期。
+
+    Args:
+        W: 图片宽度
+        H: 图片高度
+        tile_size: 块边长（原图像素）
+        overlap: 相邻块重叠比例
+        max_tiles: 最多块数
+
+    Returns:
+        [(x0, y0, w, h), ...]
+    """
+    while True:
+        step = max(1, int(tile_size * (1 - overlap)))
+        xs = _axis_starts(W, tile_size, step)
+        ys = _axis_starts(H, tile_size, step)
+        if len(xs) * len(ys) <= max_tiles or tile_size >= max(W, H):
+            break
+        tile_size = int(tile_size * 1.25)
+
+    return [(x, y, min(tile_size, W - x), min(tile_size, H - y)) for y in ys for x in xs]
+
+
+def detect_tiled(detector, img, confidence=CONFIDENCE, threshold=THRESHOLD, tile_size=TILE_SIZE,
+                 overlap=TILE_OVERLAP, max_tiles=MAX_TILES, include_full=True):
+    """
+    分块检测一张图片
+
+    Args:
+        detector: YoloDetector
+        img: BGR 图片
+        confidence: 置信度阈值
+        threshold: 全局 NMS 阈值
+        tile_size: 块边长（原图像素）
+        overlap: 相邻块重叠比例
+        max_tiles: 最多块数
+        include_full: 是否额外加入整图缩放的一块，保留大物体的检测
+
+    Returns:
+        检测结果字典（与 YoloDetector.detect 相同，另有 tiles 块数）
+    """
+    (H, W) = img.shape[:2]
+    regions = make_tiles(W, H, tile_size, overlap, max_tiles)
+    if include_full and len(regions) > 1:
+        regions.append((0, 0, W, H))
+
+    crops = [img[y:y + h, x:x + w] for (x, y, w, h) in regions]
+    per_tile, batch_time, letterboxes = detector.forward_batch(crops)
+
+    all_boxes = []
+    all_confidences = []
+    all_classIDs = []
+    for (x, y, w, h), layerOutputs, letterbox in zip(regions, per_tile, letterboxes):
+        boxes, confidences, classIDs = detector.decode(layerOutputs, w, h, confidence, letterbox)
+        # 映射回全图坐标
+        boxes[:, 0] += x
+        boxes[:, 1] += y
+        all_boxes.append(boxes)
+        all_confidences.append(confidences)
+        all_classIDs.append(classIDs)
+
+    boxes = np.concatenate(all_boxes)
+    confidences = np.concatenate(all_confidences)
+    classIDs = np.concatenate(all_classIDs)
+
+    # 跨块边界的重复框由一次全局 NMS 合并
+    idxs = detector.suppress(boxes, confidences, classIDs, confidence, threshold)
+
+    result = detector.make_result(boxes[idxs], confidences[idxs], classIDs[idxs], batch_time)
+    result['tiles'] = len(regions)
+    return result
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+视频文件 / 摄像头流检测
+采集线程把帧放入有界缓冲区，推理跟不上时丢弃最旧的帧，
+超过延迟预算的帧直接跳过，保证 CPU 上也能实时处理
+"""
+
+import collections
+import threading
+import time
+
+import cv2 as cv
+
+from streaming_stats import RunningStats, QuantileSketch
+from yolo_detector import CONFIDENCE, THRESHOLD
+
+
+class FrameSource:
+    """带丢旧策略的有界帧缓冲区，由后台线程从 cv.VideoCapture 读取"""
+
+    def __init__(self, source, queue_size=2, realtime=True):
+        """
+        Args:
+            source: 视频文件路径或摄像头编号
+            queue_size: 帧缓冲区大小，满时丢弃最旧的帧
+            realtime: 视频文件是否按原始帧率读取（模拟实时流），摄像头本身就是实时的
+        """
+        self.cap = cv.VideoCapture(source)
+        if not self.cap.isOpened():
+            raise IOError(f"无法打开视频源: {source}")
+
+        self.is_camera = isinstance(source, int)
+        self.fps = self.cap.get(cv.CAP_PROP_FPS) or 30.0
+        self.width = int(self.cap.get(cv.CAP_PROP_FRAME_WIDTH))
+        self.height = int(self.cap.get(cv.CAP_PROP_FRAME_HEIGHT))
+        self.realtime = realtime and not self.is_camera
+
+        self.frames = collections.deque(maxlen=queue_size)
+        self.cond = threading.Condition()
+        self.finished = False
+        self.captured = 0
+        self.dropped = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._capture, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _capture(self):
+        start = time.time()
+        try:
+            while not self._stop.is_set():
+                ok, frame = self.cap.read()
+                if not ok:
+                    break
+                index = self.captured
+                self.captured += 1
+
+                if self.realtime:
+                    # 按原始帧率放帧，模拟实时流
+                    delay = start + index / self.fps - time.time()
+                    if delay > 0:
+                        time.sleep(delay)
+
+                with self.cond:
+                    if len(self.frames) == self.frames.maxlen:
+                        self.dropped += 1
+                    self.frames.append((index, time.time(), frame))
+                    self.cond.notify()
+        finally:
+            # 由采集线程自己释放，避免在 cap.read() 阻塞期间被其他线程释放
+            self.cap.release()
+            with self.cond:
+                self.finished = True
+                self.cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        取出最旧的一帧
+
+        Returns:
+            (frame_index, capture_time, frame)，流结束时返回 None
+        """
+        with self.cond:
+            while not self.frames:
+                if self.finished:
+                    return None
+                self.cond.wait(timeout)
+            return self.frames.popleft()
+
+    def stop(self):
+        """通知采集线程退出；线程仍阻塞在 cap.read() 时由它在返回后自行释放 cv.VideoCapture"""
+        self._stop.set()
+        if self._thread.ident is None:
+            self.cap.release()
+            return
+        self._thread.join(timeout=2.0)
+        if self._thread.is_alive():
+            print("⚠️  采集线程仍在等待视频源，将在读取返回后释放")
+
+
+def open_video_writer(output_path, fps, width, height):
+    """创建标注后视频的写出器"""
+    fourcc = cv.VideoWriter_fourcc(*'mp4v')
+    writer = cv.VideoWriter(output_path, fourcc, fps, (width, height))
+    if not writer.isOpened():
+        raise IOError(f"无法创建输出视频: {output_path}")
+    return writer
+
+
+def detect_video(detector, source, output_path=None, confidence=CONFIDENCE, threshold=THRESHOLD,
+                 queue_size=2, latency_budget=0.5, analyzer=None, show_result=False, realtime=True,
+                 controller=None):
+    """
+    对视频流逐帧检测
+
+    Args:
+        detector: YoloDetector
+        source: 视频文件路径或摄像头编号
+        output_path: 标注后视频的保存路径（只包含实际处理的帧），为 None 时不保存
+        confidence: 置信度阈值
+        threshold: NMS 阈值
+        queue_size: 帧缓冲区大小
+        latency_budget: 延迟预算（秒），取出时已超过预算的帧直接跳过
+        analyzer: DetectionAnalyzer，逐帧记录检测结果和推理时间
+        show_result: 是否实时显示
+        realtime: 视频文件是否按原始帧率读取
+        controller: ResolutionController，根据每帧前向耗时自适应切换输入尺寸
+
+    Returns:
+        统计信息字典
+    """
+    frames = FrameSource(source, queue_size, realtime).start()
+    writer = None
+    if output_path:
+        writer = open_video_writer(output_path, frames.fps, frames.width, frames.height)
+
+    processed = 0
+    skipped = 0
+    # 长时间运行的流只保留流式统计，内存与帧数无关
+    inference_times = RunningStats()
+    latencies = RunningStats()
+    latency_sketch = QuantileSketch()
+    start = time.time()
+
+    try:
+        while True:
+            item = frames.read()
+            if item is None:
+                break
+            index, capture_time, frame = item
+
+            # 已经超出延迟预算的帧不再处理，避免积压
+            if time.time() - capture_time > latency_budget:
+                skipped += 1
+                continue
+
+            detection = detector.detect(frame, confidence, threshold)
+            detector.draw(frame, detection['boxes'], detection['confidences'], detection['classIDs'])
+
+            latency = time.time() - capture_time
+            processed += 1
+            inference_times.add(detection['inference_time'])
+            latencies.add(latency)
+            latency_sketch.add(latency)
+
+            if analyzer is not None:
+                analyzer.analyze_detection_result(detection['boxes'], detection['confidences'],
+                                                  detection['classIDs'], detector.labels,
+                                                  detection['inference_time'], verbose=False)
+
+            if controller is not None:
+                controller.observe(detection['inference_time'])
+
+            if writer is not None:
+                writer.write(frame)
+
+            if show_result:
+                cv.imshow('YOLO Video Detection', frame)
+                if cv.waitKey(1) & 0xFF == ord('q'):
+                    break
+
+            print(f"[帧 {index}] 物体: {len(detection['boxes'])}  "
+                  f"推理: {detection['inference_time']*1000:.1f} ms  延迟: {latency*1000:.1f} ms")
+    except KeyboardInterrupt:
+        print("\n检测已停止")
+    finally:
+        frames.stop()
+        if writer is not None:
+            writer.release()
+        if show_result:
+            cv.destroyAllWindows()
+
+    wall_time = time.time() - start
+    stats = {
+        'captured': frames.captured,
+        'processed': processed,
+        'dropped': frames.dropped,
+        'skipped': skipped,
+        'wall_time': wall_time,
+        'processed_fps': processed / wall_time if wall_time > 0 else 0,
+        'source_fps': frames.fps
+    }
+    if processed:
+        stats['avg_inference_time'] = inference_times.mean
+        stats['latency_p50'] = latency_sketch.quantile(0.5)
+        stats['latency_p95'] = latency_sketch.quantile(0.95)
+        stats['latency_max'] = latencies.max
+    return stats
+
+
+def print_video_stats(stats, output_path=None):
+    """打印视频检测汇总"""
+    print(f"\n{'='*60}")
+    print("视频检测汇总")
+    print(f"{'='*60}")
+    print(f"采集帧数: {stats['captured']} (源帧率 {stats['source_fps']:.2f} FPS)")
+    print(f"处理帧数: {stats['processed']}")
+    print(f"缓冲区丢弃: {stats['dropped']}")
+    print(f"超出延迟预算跳过: {stats['skipped']}")
+    print(f"处理帧率: {stats['processed_fps']:.2f} FPS")
+    if stats['processed']:
+        print(f"平均推理时间: {stats['avg_inference_time']*1000:.2f} ms")
+        print(f"端到端延迟: p50 {stats['latency_p50']*1000:.1f} ms  "
+              f"p95 {stats['latency_p95']*1000:.1f} ms  最大 {stats['latency_max']*1000:.1f} ms")
+    if output_path:
+        print(f"标注视频已保存: {output_path}")
@@ -4,24 +4,75 @@ YOLO 检测脚本（带分析功能）
 基于原 yolo-test.py，集成了检测结果分析
 """
 
-import numpy as np
 import cv2 as cv
+import numpy as np
 import os
-import time
 import argparse
+import threading
+import time
+from batch_pipeline import DetectionPipeline, sharded_detect
+from adaptive_resolution import ResolutionController
 from detection_analyzer import DetectionAnalyzer
+from detection_store import DetectionStore, STORE_FLUSH_EVERY
+from report_log import ReportWriter
+from result_cache import ResultCache
+from model_loader import print_timings
+from nms import NmsEngine, parse_class_values
+from output_replay import OutputRecorder, ReplayDetector
+from profiling import StageProfiler, JsonlHook, NULL_PROFILER
+from threshold_sweep import sweep_images, SWEEP_CONFIDENCES, SWEEP_THRESHOLDS
+from tiling import detect_tiled, TILE_SIZE, TILE_OVERLAP, MAX_TILES
+from video_stream import detect_video, print_video_stats
+from yolo_detector import YoloDetector, detected_output_path, parse_classes, load_labels, labelsPath, weightsPath, \
+    CONFIDENCE, THRESHOLD, INPUT_SIZE
+
+
+def load_detector(letterbox=False, input_size=INPUT_SIZE, load_mode='file', timings=False):
+    """
+    加载检测器（网络、标签、颜色表只加载一次）
+
+    Args:
+        letterbox: 是否使用保持宽高比的 letterbox 预处理
+        input_size: 网络输入尺寸
+        load_mode: 权重加载方式，'file' 或 'mmap'
+        timings: 是否预热并打印启动耗时分解
+
+    Returns:
+        YoloDetector，权重文件不存在时返回 None
+    """
+    if not os.path.exists(weightsPath):
+        print(f"❌ 权重文件不存在: {weightsPath}")
+        print("请运行: wget https://pjreddie.com/media/files/yolov3.weights")
+        print("并将文件放置到 cfg/ 目录")
+        return None
 
-# YOLO 配置
-yolo_dir = os.path.dirname(os.path.abspath(__file__))
-weightsPath = os.path.join(yolo_dir, 'cfg/yolov3.weights')
-configPath = os.path.join(yolo_dir, 'cfg/yolov3.cfg')
-labelsPath = os.path.join(yolo_dir, 'cfg/coco.names')
+    print("[INFO] 加载 YOLO 模型...")
+    detector = YoloDetector(input_size=input_size, letterbox=letterbox, load_mode=load_mode, warmup=timings)
+    if timings:
+        print_timings(detector.load_timings)
+    return detector
 
-CONFIDENCE = 0.5  # 过滤弱检测的最小概率
-THRESHOLD = 0.4   # 非最大值抑制阈值
 
+def make_nms_engine(labels, class_aware=False, class_confidence=None, class_threshold=None, max_detections=None):
+    """
+    按命令行参数创建 NmsEngine
 
-def detect_objects(image_path, confidence=CONFIDENCE, threshold=THRESHOLD, show_result=True, analyze=True):
+    Args:
+        labels: 类别标签列表
+        class_aware: 是否只在同类别之间抑制
+        class_confidence: "person=0.6,car=0.4" 形式的按类别置信度阈值
+        class_threshold: "person=0.5" 形式的按类别 NMS 阈值
+        max_detections: 每张图片最多保留的检测数
+    """
+    return NmsEngine(len(labels), class_aware=class_aware,
+                     class_confidences=parse_class_values(class_confidence, labels),
+                     class_thresholds=parse_class_values(class_threshold, labels),
+                     max_detections=max_detections)
+
+
+def detect_objects(image_path, confidence=CONFIDENCE, threshold=THRESHOLD, show_result=True, analyze=True,
+                   detector=None, analyzer=None, tile_options=None, profiler=None, cache=None, recorder=None,
+                   store=None):
     """
     执行物体检测
 
@@ -31,32 +82,43 @@ def detect_objects(image_path, confidence=CONFIDENCE, threshold=THRESHOLD, show_
         threshold: NMS 阈值
         show_result: 是否显示结果
         analyze: 是否进行结果分析
+        detector: 已加载的 YoloDetector，为 None 时临时加载
+        analyzer: 共用的 DetectionAnalyzer，为 None 时每次新建
+        tile_options: 分块检测参数 (tile_size, overlap, max_tiles)，为 None 时整图检测
+        profiler: StageProfiler，记录各阶段耗时，为 None 时不计时
+        cache: ResultCache，命中时直接使用保存的检测结果，不做前向
+        recorder: OutputRecorder，录制原始网络输出供 --replay 重放（整图检测时生效）
+        store: DetectionStore，检测结果逐张追加写入
 
     Returns:
         检测结果字典
     """
+    if profiler is None:
+        profiler = NULL_PROFILER
+
     print(f"\n{'='*60}")
     print(f"开始检测: {os.path.basename(image_path)}")
     print(f"{'='*60}")
     print(f"参数: CONFIDENCE={confidence}, THRESHOLD={threshold}")
 
-    # 检查文件是否存在
-    if not os.path.exists(weightsPath):
-        print(f"❌ 权重文件不存在: {weightsPath}")
-        print("请运行: wget https://pjreddie.com/media/files/yolov3.weights")
-        print("并将文件放置到 cfg/ 目录")
-        return None
-
     if not os.path.exists(image_path):
         print(f"❌ 图片文件不存在: {image_path}")
         return None
 
-    # 加载网络
-    print("[INFO] 加载 YOLO 模型...")
-    net = cv.dnn.readNetFromDarknet(configPath, weightsPath)
+    if detector is None:
+        detector = load_detector()
+        if detector is None:
+            return None
 
     # 加载图片
-    img = cv.imread(image_path)
+    key = None
+    with profiler.span('decode'):
+        if cache is not None:
+            # 文件内容只读一次，既用于计算缓存键也用于解码
+            data = np.fromfile(image_path, dtype=np.uint8)
+            img = cv.imdecode(data, cv.IMREAD_COLOR)
+        else:
+            img = cv.imread(image_path)
     if img is None:
         print(f"❌ 无法读取图片: {image_path}")
         return None
@@ -64,84 +126,105 @@ def detect_objects(image_path, confidence=CONFIDENCE, threshold=THRESHOLD, show_
     (H, W) = img.shape[:2]
     print(f"[INFO] 图片尺寸: {W}x{H}")
 
-    # 转换为 blob 格式
-    blobImg = cv.dnn.blobFromImage(img, 1.0/255.0, (416, 416), None, True, False)
-    net.setInput(blobImg)
+    detection = None
+    if cache is not None:
+        with profiler.span('cache'):
+            key = cache.key_for(data, detector, confidence, threshold, tile_options)
+            detection = cache.get(key)
+
+    # 预处理 + 前向传播 + NMS
+    if detection is not None:
+        print("[INFO] 命中结果缓存，跳过前向")
+    elif tile_options:
+        with profiler.span('tiled_detect'):
+            detection = detect_tiled(detector, img, confidence, threshold, **tile_options)
+        print(f"[INFO] 分块检测: {detection['tiles']} 块")
+    else:
+        record = None
+        if recorder is not None:
+            def record(layerOutputs, W, H, letterbox, inference_time):
+                with profiler.span('record'):
+                    recorder.add(image_path, layerOutputs, W, H, letterbox, detector.input_size, inference_time)
+        detection = detector.detect(img, confidence, threshold, profiler, record)
+    if key is not None and not detection.get('cached'):
+        cache.put(key, detection)
+    result = handle_detection(image_path, img, detection, detector, confidence, show_result, analyze, analyzer,
+                              profiler, store)
+    profiler.finish(image_path)
+    return result
 
-    # 前向传播
-    outInfo = net.getUnconnectedOutLayersNames()
-    start = time.time()
-    layerOutputs = net.forward(outInfo)
-    end = time.time()
-    inference_time = end - start
-
-    print(f"[INFO] YOLO 推理时间: {inference_time:.4f} 秒 ({inference_time*1000:.2f} ms)")
-
-    # 处理检测结果
-    boxes = []
-    confidences = []
-    classIDs = []
-
-    # 过滤低置信度检测
-    for out in layerOutputs:
-        for detection in out:
-            scores = detection[5:]
-            classID = np.argmax(scores)
-            conf = scores[classID]
-
-            if conf > confidence:
-                box = detection[0:4] * np.array([W, H, W, H])
-                (centerX, centerY, width, height) = box.astype("int")
-                x = int(centerX - (width / 2))
-                y = int(centerY - (height / 2))
-                boxes.append([x, y, int(width), int(height)])
-                confidences.append(float(conf))
-                classIDs.append(classID)
-
-    # 应用 NMS
-    idxs = cv.dnn.NMSBoxes(boxes, confidences, confidence, threshold)
-
-    # 过滤后的结果
-    final_boxes = []
-    final_confidences = []
-    final_classIDs = []
-
-    if len(idxs) > 0:
-        for i in idxs.flatten():
-            final_boxes.append(boxes[i])
-            final_confidences.append(confidences[i])
-            final_classIDs.append(classIDs[i])
-
-    # 加载标签
-    with open(labelsPath, 'rt') as f:
-        labels = f.read().rstrip('\n').split('\n')
 
-    print(f"\n[INFO] 检测到 {len(final_boxes)} 个物体")
+def handle_detection(image_path, img, detection, detector, confidence=CONFIDENCE, show_result=True, analyze=True,
+                     analyzer=None, profiler=NULL_PROFILER, store=None):
+    """
+    绘制、保存、显示并分析一张图片的检测结果
 
-    # 绘制结果
-    np.random.seed(42)
-    COLORS = np.random.randint(0, 255, size=(len(labels), 3), dtype="uint8")
-
-    if len(final_boxes) > 0:
-        for i, (box, conf, classID) in enumerate(zip(final_boxes, final_confidences, final_classIDs)):
-            (x, y, w, h) = box
-            color = [int(c) for c in COLORS[classID]]
-            cv.rectangle(img, (x, y), (x+w, y+h), color, 2)
-            text = "{}: {:.2%}".format(labels[classID], conf)
-            cv.putText(img, text, (x, y-5), cv.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
-
-    # 保存结果图片
-    output_path = image_path.replace('.jpg', '_detected.jpg').replace('.png', '_detected.png')
-    cv.imwrite(output_path, img)
-    print(f"[INFO] 检测结果已保存: {output_path}")
+    Args:
+        image_path: 图片路径
+        img: 已读取的图片
+        detection: YoloDetector.detect 返回的检测结果
+        detector: YoloDetector
+        confidence: 置信度阈值（用于提示信息）
+        show_result: 是否显示结果
+        analyze: 是否进行结果分析
+        analyzer: 共用的 DetectionAnalyzer，为 None 时新建
+        profiler: StageProfiler，记录 draw / imwrite / analysis 阶段耗时
+        store: DetectionStore，检测结果追加写入
+
+    Returns:
+        检测结果字典
+    """
+    output_path = save_detection(image_path, img, detection, detector, profiler)
 
     # 显示结果
-    if show_result and len(final_boxes) > 0:
+    if show_result and len(detection['boxes']) > 0:
         cv.imshow('YOLO Detection Result', img)
         print("\n按任意键关闭窗口...")
         cv.waitKey(0)
         cv.destroyAllWindows()
 
+    return report_detection(image_path, output_path, detection, detector, confidence, analyze, analyzer, profiler,
+                            store)
+
+
+def save_detection(image_path, img, detection, detector, profiler=NULL_PROFILER):
+    """
+    在图片上绘制检测结果并保存
+
+    Returns:
+        结果图片路径
+    """
+    with profiler.span('draw'):
+        detector.draw(img, detection['boxes'], detection['confidences'], detection['classIDs'])
+
+    output_path = detected_output_path(image_path)
+    with profiler.span('imwrite'):
+        cv.imwrite(output_path, img)
+    return output_path
+
+
+def report_detection(image_path, output_path, detection, detector, confidence=CONFIDENCE, analyze=True,
+                     analyzer=None, profiler=NULL_PROFILER, store=None):
+    """
+    打印检测信息、分析结果并追加写入存储（store 为 DetectionStore，为 None 时不写入）
+
+    Returns:
+        检测结果字典
+    """
+    final_boxes = detection['boxes']
+    final_confidences = detection['confidences']
+    final_classIDs = detection['classIDs']
+    inference_time = detection['inference_time']
+    cached = bool(detection.get('cached'))
+    labels = detector.labels
+
+    if cached:
+        print(f"[INFO] 命中结果缓存（原推理时间 {inference_time*1000:.2f} ms，不计入统计）")
+    else:
+        print(f"[INFO] YOLO 推理时间: {inference_time:.4f} 秒 ({inference_time*1000:.2f} ms)")
+    print(f"\n[INFO] 检测到 {len(final_boxes)} 个物体")
+    print(f"[INFO] 检测结果已保存: {output_path}")
+
     # 分析结果
     result = {
         'image_path': image_path,
@@ -151,16 +234,25 @@ def detect_objects(image_path, confidence=CONFIDENCE, threshold=THRESHOLD, show_
         'labels': labels,
         'inference_time': inference_time
     }
+    if 'batch_time' in detection:
+        result['batch_time'] = detection['batch_time']
+        result['batch_size'] = detection['batch_size']
+    if cached:
+        result['cached'] = True
+    if store is not None:
+        store.add_result(result)
 
     if analyze and len(final_boxes) > 0:
-        analyzer = DetectionAnalyzer()
-        analyzer.analyze_detection_result(
-            final_boxes,
-            final_confidences,
-            final_classIDs,
-            labels,
-            inference_time
-        )
+        if analyzer is None:
+            analyzer = DetectionAnalyzer()
+        with profiler.span('analysis'):
+            analyzer.analyze_detection_result(
+                final_boxes,
+                final_confidences,
+                final_classIDs,
+                labels,
+                None if cached else inference_time  # 缓存中的是以前的耗时，不计入延迟统计
+            )
     elif len(final_boxes) == 0:
         print("\n⚠️  未检测到任何物体")
         print("建议:")
@@ -171,13 +263,145 @@ def detect_objects(image_path, confidence=CONFIDENCE, threshold=THRESHOLD, show_
     return result
 
 
-def batch_detect(image_dir, pattern="*.jpg", **kwargs):
+def detect_image_batch(image_paths, detector, confidence=CONFIDENCE, threshold=THRESHOLD, analyze=True,
+                       analyzer=None, cache=None, store=None):
+    """
+    将一组图片合成一个 blob，单次前向后按图片拆分结果
+
+    Args:
+        image_paths: 图片路径列表
+        detector: YoloDetector
+        confidence: 置信度阈值
+        threshold: NMS 阈值
+        analyze: 是否进行结果分析
+        analyzer: 共用的 DetectionAnalyzer
+        cache: ResultCache，命中的图片不参与前向
+        store: DetectionStore，检测结果逐张追加写入
+
+    Returns:
+        检测结果字典列表
+    """
+    results = []
+    paths = []
+    imgs = []
+    keys = []
+    for image_path in image_paths:
+        if cache is not None:
+            data = np.fromfile(image_path, dtype=np.uint8)
+            img = cv.imdecode(data, cv.IMREAD_COLOR)
+        else:
+            img = cv.imread(image_path)
+        if img is None:
+            print(f"❌ 无法读取图片: {image_path}")
+            continue
+
+        if cache is not None:
+            key = cache.key_for(data, detector, confidence, threshold)
+            detection = cache.get(key)
+            if detection is not None:
+                print(f"\n--- {os.path.basename(image_path)} ({img.shape[1]}x{img.shape[0]}，命中结果缓存) ---")
+                results.append(handle_detection(image_path, img, detection, detector, confidence,
+                                                show_result=False, analyze=analyze, analyzer=analyzer, store=store))
+                continue
+            keys.append(key)
+        paths.append(image_path)
+        imgs.append(img)
+
+    if not imgs:
+        return results
+
+    print(f"\n{'='*60}")
+    print(f"批量前向: {len(imgs)} 张图片")
+    print(f"{'='*60}")
+
+    detections, batch_time = detector.detect_batch(imgs, confidence, threshold)
+    print(f"[INFO] 整批推理时间: {batch_time*1000:.2f} ms "
+          f"(每张 {batch_time/len(imgs)*1000:.2f} ms)")
+
+    if cache is not None:
+        for key, detection in zip(keys, detections):
+            cache.put(key, detection)
+
+    for image_path, img, detection in zip(paths, imgs, detections):
+        print(f"\n--- {os.path.basename(image_path)} ({img.shape[1]}x{img.shape[0]}) ---")
+        results.append(handle_detection(image_path, img, detection, detector, confidence,
+                                        show_result=False, analyze=analyze, analyzer=analyzer, store=store))
+    return results
+
+
+def pipeline_detect(image_paths, detector, confidence=CONFIDENCE, threshold=THRESHOLD, analyze=True,
+                    analyzer=None, batch_size=1, read_workers=2, write_workers=2, read_queue_depth=4,
+                    write_queue_depth=4, store=None):
+    """
+    流水线方式批量检测：读取/预处理、推理、绘制/保存/分析并行执行
+
+    Returns:
+        (检测结果字典列表, DetectionPipeline)
+    """
+    print_lock = threading.Lock()
+
+    def write_fn(image_path, img, detection):
+        # 绘制和 imwrite 在写出线程中并行，打印、分析和写入存储串行以免输出交错
+        output_path = save_detection(image_path, img, detection, detector)
+        with print_lock:
+            print(f"\n--- {os.path.basename(image_path)} ({img.shape[1]}x{img.shape[0]}) ---")
+            return report_detection(image_path, output_path, detection, detector, confidence, analyze, analyzer,
+                                    store=store)
+
+    pipeline = DetectionPipeline(detector, write_fn,
+                                 read_workers=read_workers, write_workers=write_workers,
+                                 read_queue_depth=read_queue_depth, write_queue_depth=write_queue_depth,
+                                 batch_size=batch_size)
+    results = pipeline.run(image_paths, confidence, threshold)
+    return results, pipeline
+
+
+def sharded_batch_detect(image_paths, detector, confidence=CONFIDENCE, threshold=THRESHOLD, analyze=True,
+                         analyzer=None, workers=2, threads_per_worker=1, store=None):
+    """
+    多进程分片检测：子进程负责读取、推理、绘制和保存，汇总与分析在主进程完成
+
+    Returns:
+        检测结果字典列表
+    """
+    print(f"\n[INFO] 多进程检测: {workers} 个进程 x {threads_per_worker} 线程")
+    results = []
+    for image_path, output_path, detection in sharded_detect(detector, image_paths, workers, threads_per_worker,
+                                                             confidence, threshold):
+        if detection is None:
+            print(f"❌ 无法读取图片: {image_path}")
+            continue
+        print(f"\n--- {os.path.basename(image_path)} (进程 {detection['worker_pid']}) ---")
+        results.append(report_detection(image_path, output_path, detection, detector, confidence, analyze, analyzer,
+                                        store=store))
+    return results
+
+
+def batch_detect(image_dir, pattern="*.jpg", detector=None, batch_size=1, pipeline=False,
+                 read_workers=2, write_workers=2, read_queue_depth=4, write_queue_depth=4,
+                 workers=1, threads_per_worker=1, controller=None, tile_options=None, profiler=None, store_path=None,
+                 cache=None, recorder=None, **kwargs):
     """
     批量检测目录中的图片
 
     Args:
         image_dir: 图片目录
         pattern: 文件匹配模式
+        detector: 已加载的 YoloDetector，为 None 时加载一次供所有图片共用
+        batch_size: 每次前向的图片数，大于 1 时使用 blobFromImages 批量推理
+        pipeline: 是否使用流水线（读取、推理、写出重叠执行）
+        read_workers: 流水线读取/预处理线程数
+        write_workers: 流水线绘制/保存/分析线程数
+        read_queue_depth: 流水线读取 -> 推理队列深度
+        write_queue_depth: 流水线推理 -> 写出队列深度
+        workers: 大于 1 时按进程分片检测
+        threads_per_worker: 多进程检测时每个进程的 OpenCV 线程数
+        controller: ResolutionController，逐张检测时根据前向耗时自适应切换输入尺寸
+        tile_options: 分块检测参数，逐张检测时生效
+        profiler: StageProfiler，逐张检测时记录各阶段耗时
+        store_path: 检测结果追加写入该目录的列式存储（见 detection_store.py）
+        cache: ResultCache，逐张和 --batch-size 批量检测时跳过未变化的图片
+        recorder: OutputRecorder，逐张检测时录制原始网络输出
         **kwargs: 传递给 detect_objects 的参数
     """
     import glob
@@ -185,11 +409,59 @@ def batch_detect(image_dir, pattern="*.jpg", **kwargs):
     image_files = glob.glob(os.path.join(image_dir, pattern))
     print(f"\n找到 {len(image_files)} 张图片")
 
+    if detector is None and image_files:
+        detector = load_detector()
+        if detector is None:
+            return []
+
+    # 所有图片共用一个分析器，历史记录汇总在一起
+    if kwargs.get('analyze', True) and kwargs.get('analyzer') is None:
+        kwargs['analyzer'] = DetectionAnalyzer()
+
+    # 存储在检测开始前打开，每张图片的结果立即写入，中途崩溃只丢失最后未刷新的几张
+    store = None
+    if store_path:
+        store = DetectionStore(store_path, flush_every=STORE_FLUSH_EVERY)
+        kwargs['store'] = store
+
+    serial = workers <= 1 and not pipeline and batch_size <= 1
+    if not serial and (tile_options or controller is not None or profiler is not None or recorder is not None):
+        print("⚠️  分块检测、自适应分辨率、阶段计时和输出录制只在逐张批量检测时生效")
+    if cache is not None and (workers > 1 or pipeline):
+        print("⚠️  结果缓存只在逐张和 --batch-size 批量检测时生效")
+
     results = []
-    for img_path in image_files:
-        result = detect_objects(img_path, show_result=False, **kwargs)
-        if result:
-            results.append(result)
+    num_batches = 0
+    runner = None
+    try:
+        if workers > 1:
+            results = sharded_batch_detect(image_files, detector, workers=workers,
+                                           threads_per_worker=threads_per_worker, **kwargs)
+        elif pipeline:
+            results, runner = pipeline_detect(image_files, detector, batch_size=batch_size,
+                                              read_workers=read_workers, write_workers=write_workers,
+                                              read_queue_depth=read_queue_depth,
+                                              write_queue_depth=write_queue_depth, **kwargs)
+            num_batches = round(sum(1 / r.get('batch_size', 1) for r in results))
+        elif batch_size > 1:
+            for i in range(0, len(image_files), batch_size):
+                batch_results = detect_image_batch(image_files[i:i + batch_size], detector, cache=cache, **kwargs)
+                if batch_results:
+                    results.extend(batch_results)
+                    if any(not r.get('cached') for r in batch_results):
+                        num_batches += 1
+        else:
+            for img_path in image_files:
+                result = detect_objects(img_path, show_result=False, detector=detector, tile_options=tile_options,
+                                        profiler=profiler, cache=cache, recorder=recorder, **kwargs)
+                if result:
+                    results.append(result)
+                    if controller is not None and not result.get('cached'):
+                        controller.observe(result['inference_time'])
+    finally:
+        if store is not None:
+            store.close()
+            print(f"检测结果已追加到存储: {store_path}（存储中共 {store.next_image_id} 张图片）")
 
     # 汇总统计
     if results:
@@ -197,19 +469,173 @@ def batch_detect(image_dir, pattern="*.jpg", **kwargs):
         print("批量检测汇总")
         print(f"{'='*60}")
         total_objects = sum(len(r['boxes']) for r in results)
-        avg_time = sum(r['inference_time'] for r in results) / len(results)
         avg_confidence = sum(sum(r['confidences'])/len(r['confidences']) if r['confidences'] else 0
                            for r in results) / len(results)
+        # 命中缓存的图片没有做前向，耗时只统计实际推理的图片
+        timed = [r for r in results if not r.get('cached')]
 
         print(f"处理图片数: {len(results)}")
+        if len(timed) < len(results):
+            print(f"命中缓存: {len(results) - len(timed)} 张（不计入推理时间统计）")
         print(f"检测物体总数: {total_objects}")
-        print(f"平均推理时间: {avg_time*1000:.2f} ms")
         print(f"平均置信度: {avg_confidence:.2%}")
-        print(f"平均 FPS: {1/avg_time:.2f}")
+        total_time = sum(r['inference_time'] for r in timed)
+        if timed and total_time > 0:
+            avg_time = total_time / len(timed)
+            print(f"平均推理时间: {avg_time*1000:.2f} ms")
+            print(f"平均 FPS: {1/avg_time:.2f}")
+
+            if batch_size > 1 and num_batches:
+                print(f"批大小: {batch_size} (共 {num_batches} 批)")
+                print(f"平均每批推理时间: {total_time/num_batches*1000:.2f} ms")
+                print(f"平均每张推理时间: {avg_time*1000:.2f} ms")
+                print(f"吞吐量: {len(timed)/total_time:.2f} 张/秒")
+
+        if controller is not None:
+            controller.print_summary()
+
+        if profiler is not None:
+            profiler.print_summary()
+
+        if kwargs.get('analyzer') is not None:
+            kwargs['analyzer'].print_summary()
+
+        if cache is not None:
+            cache.print_stats()
+
+        if runner:
+            wall_time = runner.last_stats['wall_time']
+            print(f"端到端吞吐量: {len(results)/wall_time:.2f} 张/秒")
+            runner.print_stats()
 
     return results
 
 
+def replay_detect(recording_path, confidence=CONFIDENCE, threshold=THRESHOLD, analyze=True, analyzer=None,
+                  save=False, nms_options=None, classes=None):
+    """
+    重放录制的原始网络输出：不加载权重、不做前向，只执行后处理和分析
+
+    Args:
+        recording_path: --record 写入的录制目录
+        confidence: 置信度阈值
+        threshold: NMS 阈值
+        analyze: 是否记录到分析器
+        analyzer: 共用的 DetectionAnalyzer，为 None 时新建
+        save: 是否读取原图并绘制、保存、打印（与 detect_objects 后半段相同），
+              为 False 时只做后处理和分析，按磁盘速度运行
+        nms_options: NmsEngine 参数，为 None 时使用 cv.dnn.NMSBoxes
+        classes: "person,car" 形式的类别白名单，为 None 时检测所有类别
+
+    Returns:
+        检测结果字典列表
+    """
+    try:
+        replay = ReplayDetector(recording_path)
+    except FileNotFoundError as e:
+        print(f"❌ {e}")
+        return []
+    if nms_options is not None:
+        replay.nms = make_nms_engine(replay.labels, **nms_options)
+    replay.classes = parse_classes(classes, replay.labels)
+    try:
+        replay.check_confidence(confidence)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return []
+
+    print(f"\n[INFO] 重放 {len(replay)} 条录制记录: {recording_path}")
+    if analyze and analyzer is None:
+        analyzer = DetectionAnalyzer(history_size=1000)
+
+    results = []
+    start = time.time()
+    for i in range(len(replay)):
+        image_path, detection = replay.detect_record(i, confidence, threshold)
+        if save:
+            img = cv.imread(image_path)
+            if img is None:
+                print(f"❌ 无法读取图片: {image_path}")
+                continue
+            print(f"\n--- {os.path.basename(image_path)} (重放) ---")
+            results.append(handle_detection(image_path, img, detection, replay, confidence,
+                                            show_result=False, analyze=analyze, analyzer=analyzer))
+        else:
+            if analyzer is not None:
+                analyzer.analyze_detection_result(detection['boxes'], detection['confidences'],
+                                                  detection['classIDs'], replay.labels,
+                                                  detection['inference_time'], verbose=False)
+            detection['image_path'] = image_path
+            results.append(detection)
+    wall_time = time.time() - start
+
+    print(f"\n{'='*60}")
+    print("重放汇总")
+    print(f"{'='*60}")
+    print(f"重放记录数: {len(results)}")
+    print(f"检测物体总数: {sum(len(r['boxes']) for r in results)}")
+    print(f"重放耗时: {wall_time*1000:.2f} ms ({len(results)/wall_time if wall_time > 0 else 0:.1f} 张/秒)")
+    if analyzer is not None:
+        analyzer.print_summary()
+    return results
+
+
+def video_detect(source, detector, output_path=None, confidence=CONFIDENCE, threshold=THRESHOLD,
+                 queue_size=2, latency_budget=0.5, show_result=True, analyze=True, controller=None, analyzer=None):
+    """
+    视频文件 / 摄像头检测
+
+    Args:
+        source: 视频文件路径，或摄像头编号（纯数字字符串）
+        detector: YoloDetector
+        output_path: 标注后视频的保存路径，为 None 时视频文件保存为 *_detected.mp4，摄像头不保存
+        confidence: 置信度阈值
+        threshold: NMS 阈值
+        queue_size: 帧缓冲区大小
+        latency_budget: 延迟预算（秒）
+        show_result: 是否实时显示
+        analyze: 是否逐帧记录到分析器
+        controller: ResolutionController，根据每帧前向耗时自适应切换输入尺寸
+        analyzer: 共用的 DetectionAnalyzer，为 None 时新建
+
+    Returns:
+        统计信息字典
+    """
+    if source.isdigit():
+        source = int(source)
+    elif not os.path.exists(source):
+        print(f"❌ 视频文件不存在: {source}")
+        return None
+    elif output_path is None:
+        output_path = os.path.splitext(source)[0] + '_detected.mp4'
+
+    print(f"\n{'='*60}")
+    print(f"开始视频检测: {source}")
+    print(f"{'='*60}")
+    print(f"参数: CONFIDENCE={confidence}, THRESHOLD={threshold}, "
+          f"缓冲区={queue_size}, 延迟预算={latency_budget*1000:.0f} ms")
+
+    if not analyze:
+        analyzer = None
+    elif analyzer is None:
+        analyzer = DetectionAnalyzer()
+    try:
+        stats = detect_video(detector, source, output_path, confidence, threshold,
+                             queue_size=queue_size, latency_budget=latency_budget,
+                             analyzer=analyzer, show_result=show_result, controller=controller)
+    except IOError as e:
+        print(f"❌ {e}")
+        return None
+
+    print_video_stats(stats, output_path)
+    if controller is not None:
+        controller.print_summary()
+    if analyzer is not None and analyzer.results_history:
+        analyzer.compare_with_history()
+        analyzer.print_summary()
+    return stats
+
+
 def main():
     parser = argparse.ArgumentParser(description='YOLO 物体检测（带分析功能）')
     parser.add_argument('-i', '--image', type=str, default='data/person.jpg',
@@ -222,31 +648,243 @@ def main():
                        help='不显示检测结果窗口')
     parser.add_argument('--no-analyze', action='store_true',
                        help='不进行结果分析')
+    parser.add_argument('--letterbox', action='store_true',
+                       help='保持宽高比缩放并填充（默认直接拉伸到输入尺寸）')
+    parser.add_argument('--input-size', type=int, default=INPUT_SIZE,
+                       help='网络输入尺寸，需为 32 的倍数 (默认: 416)')
+    parser.add_argument('--class-nms', action='store_true',
+                       help='按类别做 NMS（不同类别的框互不抑制），使用 NumPy NMS')
+    parser.add_argument('--class-confidence', type=str,
+                       help='按类别置信度阈值，如 "person=0.6,car=0.4"，使用 NumPy NMS')
+    parser.add_argument('--class-threshold', type=str,
+                       help='按类别 NMS 阈值，如 "person=0.5"，使用 NumPy NMS')
+    parser.add_argument('--max-detections', type=int,
+                       help='每张图片最多保留的检测数（按置信度），使用 NumPy NMS')
+    parser.add_argument('--classes', type=str,
+                       help='只检测这些类别，如 "person,car,bicycle"（按 cfg/coco.names 中的名称）')
+    parser.add_argument('--tile', action='store_true',
+                       help='大图分块检测（单张和逐张批量检测）')
+    parser.add_argument('--tile-size', type=int, default=TILE_SIZE,
+                       help=f'分块边长（原图像素，默认: {TILE_SIZE}）')
+    parser.add_argument('--tile-overlap', type=float, default=TILE_OVERLAP,
+                       help=f'相邻块重叠比例 (默认: {TILE_OVERLAP})')
+    parser.add_argument('--max-tiles', type=int, default=MAX_TILES,
+                       help=f'每张图片最多块数，超出时自动放大块尺寸 (默认: {MAX_TILES})')
+    parser.add_argument('--load-mode', choices=['file', 'mmap'], default='file',
+                       help='权重加载方式：file 按路径读取，mmap 映射后走内存缓冲区 (默认: file)')
+    parser.add_argument('--timings', action='store_true',
+                       help='打印启动耗时分解（标识、解析、标签、预热）')
+    parser.add_argument('--profile', action='store_true',
+                       help='记录各阶段耗时（解码、预处理、前向、后处理、绘制、保存、分析）')
+    parser.add_argument('--profile-layers', action='store_true',
+                       help='同时记录逐层耗时（net.getPerfProfile），隐含 --profile')
+    parser.add_argument('--profile-log', type=str,
+                       help='每张图片的阶段耗时追加写入该 JSONL 文件，隐含 --profile')
+    parser.add_argument('--adaptive-latency', type=float,
+                       help='目标单帧前向耗时（毫秒），在 320/416/512/608 之间自适应切换输入尺寸'
+                            '（视频和逐张批量检测）')
+    parser.add_argument('--history-size', type=int,
+                       help='分析器只保留最近 N 条记录，全程统计在线汇总，长时间运行内存不增长 (默认: 全部保留)')
+    parser.add_argument('--report-log', type=str,
+                       help='分析记录逐条追加写入该 JSONL 文件（可用 report_log.py 汇总）')
+    parser.add_argument('--report-flush', type=int, default=1,
+                       help='报告日志每缓冲多少条记录写入一次 (默认: 1)')
+    parser.add_argument('--report-max-mb', type=float,
+                       help='报告日志超过该大小（MB）时轮转')
+    parser.add_argument('--sweep', action='store_true',
+                       help='阈值扫描：每张图片只前向一次，评估置信度 x NMS 阈值网格（单张或 -b 目录）')
+    parser.add_argument('--sweep-confidences', type=str, default=','.join(map(str, SWEEP_CONFIDENCES)),
+                       help='扫描的置信度阈值列表 (默认: 0.3,0.4,0.5,0.6,0.7)')
+    parser.add_argument('--sweep-thresholds', type=str, default=','.join(map(str, SWEEP_THRESHOLDS)),
+                       help='扫描的 NMS 阈值列表 (默认: 0.3,0.4,0.5,0.6,0.7)')
+    parser.add_argument('--sweep-output', type=str,
+                       help='阈值扫描结果导出为 JSON')
+    parser.add_argument('--record', type=str,
+                       help='把原始网络输出录制到该目录（单张和逐张批量检测），供 --replay 使用')
+    parser.add_argument('--record-dtype', choices=['float32', 'float16'], default='float32',
+                       help='录制精度，float16 文件减半 (默认: float32)')
+    parser.add_argument('--record-min-score', type=float, default=0.0,
+                       help='只录制最高类别得分大于该值的行，重放阈值不能低于该值 (默认: 0，全部录制)')
+    parser.add_argument('--replay', type=str,
+                       help='重放录制目录：不加载权重，只执行后处理和分析')
+    parser.add_argument('--replay-save', action='store_true',
+                       help='重放时读取原图并绘制、保存结果')
     parser.add_argument('-b', '--batch', type=str,
                        help='批量处理目录')
+    parser.add_argument('--video', type=str,
+                       help='视频文件路径或摄像头编号')
+    parser.add_argument('--video-output', type=str,
+                       help='标注后视频的保存路径 (默认: <视频名>_detected.mp4)')
+    parser.add_argument('--frame-queue', type=int, default=2,
+                       help='视频帧缓冲区大小，满时丢弃最旧帧 (默认: 2)')
+    parser.add_argument('--latency-budget', type=float, default=500,
+                       help='视频帧延迟预算（毫秒），超出的帧直接跳过 (默认: 500)')
     parser.add_argument('-p', '--pattern', type=str, default='*.jpg',
                        help='批量处理时的文件匹配模式')
+    parser.add_argument('--batch-size', type=int, default=1,
+                       help='批量处理时每次前向的图片数 (默认: 1)')
+    parser.add_argument('--pipeline', action='store_true',
+                       help='批量处理时使用流水线（读取、推理、写出重叠执行）')
+    parser.add_argument('--read-workers', type=int, default=2,
+                       help='流水线读取/预处理线程数 (默认: 2)')
+    parser.add_argument('--write-workers', type=int, default=2,
+                       help='流水线绘制/保存/分析线程数 (默认: 2)')
+    parser.add_argument('--read-queue', type=int, default=4,
+                       help='流水线读取 -> 推理队列深度 (默认: 4)')
+    parser.add_argument('--write-queue', type=int, default=4,
+                       help='流水线推理 -> 写出队列深度 (默认: 4)')
+    parser.add_argument('--store', type=str,
+                       help='批量检测结果追加写入该目录的列式存储（可 memmap 查询）')
+    parser.add_argument('--cache', type=str,
+                       help='检测结果缓存目录，图片内容和参数未变时跳过前向')
+    parser.add_argument('--cache-max-mb', type=float, default=256,
+                       help='结果缓存大小上限（MB），超出时淘汰最久未使用的条目 (默认: 256)')
+    parser.add_argument('--workers', type=int, default=1,
+                       help='批量处理时的检测进程数 (默认: 1)')
+    parser.add_argument('--threads-per-worker', type=int, default=1,
+                       help='多进程检测时每个进程的 OpenCV 线程数 (默认: 1)')
 
     args = parser.parse_args()
 
-    if args.batch:
-        # 批量处理
-        batch_detect(
-            args.batch,
-            pattern=args.pattern,
-            confidence=args.confidence,
-            threshold=args.threshold,
-            analyze=not args.no_analyze
-        )
-    else:
-        # 单张图片检测
-        detect_objects(
-            args.image,
-            confidence=args.confidence,
-            threshold=args.threshold,
-            show_result=not args.no_show,
-            analyze=not args.no_analyze
-        )
+    # 按类别参数在加载模型前检查，拼写错误直接给出用法提示
+    labels = load_labels(labelsPath)
+    for option, spec in (('--class-confidence', args.class_confidence), ('--class-threshold', args.class_threshold)):
+        try:
+            parse_class_values(spec, labels)
+        except ValueError as e:
+            parser.error(f"{option}: {e}")
+    try:
+        parse_classes(args.classes, labels)
+    except ValueError as e:
+        parser.error(f"--classes: {e}")
+
+    nms_options = None
+    if args.class_nms or args.class_confidence or args.class_threshold or args.max_detections:
+        nms_options = {'class_aware': args.class_nms, 'class_confidence': args.class_confidence,
+                       'class_threshold': args.class_threshold, 'max_detections': args.max_detections}
+
+    if args.replay:
+        analyzer = DetectionAnalyzer(history_size=args.history_size or 1000) if not args.no_analyze else None
+        replay_detect(args.replay, args.confidence, args.threshold, analyze=not args.no_analyze,
+                      analyzer=analyzer, save=args.replay_save, nms_options=nms_options,
+                      classes=args.classes)
+        return
+
+    # 模型只加载一次
+    detector = load_detector(letterbox=args.letterbox, input_size=args.input_size,
+                             load_mode=args.load_mode, timings=args.timings)
+    if detector is None:
+        return
+    if nms_options is not None:
+        detector.nms = make_nms_engine(detector.labels, **nms_options)
+    detector.classes = parse_classes(args.classes, detector.labels)
+
+    tile_options = None
+    if args.tile:
+        tile_options = {'tile_size': args.tile_size, 'overlap': args.tile_overlap, 'max_tiles': args.max_tiles}
+
+    profiler = None
+    if args.profile or args.profile_layers or args.profile_log:
+        profiler = StageProfiler(layers=args.profile_layers)
+        if args.profile_log:
+            profiler.add_hook(JsonlHook(args.profile_log))
+
+    analyzer = None
+    writer = None
+    if args.report_log and not args.no_analyze:
+        max_bytes = int(args.report_max_mb * 1024 * 1024) if args.report_max_mb else None
+        writer = ReportWriter(args.report_log, flush_every=args.report_flush, max_bytes=max_bytes)
+    if (args.history_size or writer is not None) and not args.no_analyze:
+        analyzer = DetectionAnalyzer(history_size=args.history_size, writer=writer)
+
+    recorder = None
+    if args.record:
+        recorder = OutputRecorder(args.record, detector, args.record_dtype, args.record_min_score)
+
+    cache = None
+    if args.cache:
+        cache = ResultCache(args.cache, max_bytes=int(args.cache_max_mb * 1024 * 1024))
+
+    controller = None
+    if args.adaptive_latency:
+        controller = ResolutionController(detector, args.adaptive_latency / 1000)
+
+    try:
+        if args.sweep:
+            # 阈值扫描
+            import glob
+            if args.batch:
+                image_paths = sorted(glob.glob(os.path.join(args.batch, args.pattern)))
+            else:
+                image_paths = [args.image]
+            sweep = sweep_images(detector, image_paths,
+                                 [float(x) for x in args.sweep_confidences.split(',')],
+                                 [float(x) for x in args.sweep_thresholds.split(',')])
+            sweep.print_results()
+            if args.sweep_output:
+                sweep.export(args.sweep_output)
+        elif args.video:
+            # 视频检测
+            video_detect(
+                args.video,
+                detector,
+                output_path=args.video_output,
+                confidence=args.confidence,
+                threshold=args.threshold,
+                queue_size=args.frame_queue,
+                latency_budget=args.latency_budget / 1000,
+                show_result=not args.no_show,
+                analyze=not args.no_analyze,
+                controller=controller,
+                analyzer=analyzer
+            )
+        elif args.batch:
+            # 批量处理
+            batch_detect(
+                args.batch,
+                pattern=args.pattern,
+                detector=detector,
+                batch_size=args.batch_size,
+                pipeline=args.pipeline,
+                read_workers=args.read_workers,
+                write_workers=args.write_workers,
+                read_queue_depth=args.read_queue,
+                write_queue_depth=args.write_queue,
+                workers=args.workers,
+                threads_per_worker=args.threads_per_worker,
+                controller=controller,
+                tile_options=tile_options,
+                profiler=profiler,
+                store_path=args.store,
+                cache=cache,
+                recorder=recorder,
+                confidence=args.confidence,
+                threshold=args.threshold,
+                analyze=not args.no_analyze,
+                analyzer=analyzer
+            )
+        else:
+            # 单张图片检测
+            detect_objects(
+                args.image,
+                confidence=args.confidence,
+                threshold=args.threshold,
+                show_result=not args.no_show,
+                analyze=not args.no_analyze,
+                detector=detector,
+                analyzer=analyzer,
+                tile_options=tile_options,
+                profiler=profiler,
+                cache=cache,
+                recorder=recorder
+            )
+            if profiler is not None:
+                profiler.print_summary()
+    finally:
+        if writer is not None:
+            writer.close()
+        if recorder is not None:
+            recorder.close()
 
 
 if __name__ == "__main__":
@@ -2,6 +2,7 @@ import numpy as np
 import cv2 as cv
 import os
 import time
+from yolo_detector import decode_outputs
 
 #yolo_dir = '/home/hessesummer/github/NTS-Net-my/yolov3'  # YOLO文件路径
 yolo_dir = 'D:\\01) SAIC Projects\\88) Personal Source\\yolo-test'
@@ -40,27 +41,12 @@ print("[INFO] YOLO took {:.6f} seconds".format(end - start))  # # 可以打印
 # 过滤layerOutputs
 # layerOutputs的第1维的元素内容: [center_x, center_y, width, height, objectness, N-class score data]
 # 过滤后的结果放入：
-boxes = [] # 所有边界框（各层结果放一起）
-confidences = [] # 所有置信度
-classIDs = [] # 所有分类ID
+# boxes 所有边界框（各层结果放一起），(N, 4) 数组
+# confidences 所有置信度，(N,) 数组
+# classIDs 所有分类ID，(N,) 数组
 
-# # 1）过滤掉置信度低的框框
-for out in layerOutputs:  # 各个输出层
-    for detection in out:  # 各个框框
-        # 拿到置信度
-        scores = detection[5:]  # 各个类别的置信度
-        classID = np.argmax(scores)  # 最高置信度的id即为分类id
-        confidence = scores[classID]  # 拿到置信度
-
-        # 根据置信度筛查
-        if confidence > CONFIDENCE:
-            box = detection[0:4] * np.array([W, H, W, H])  # 将边界框放会图片尺寸
-            (centerX, centerY, width, height) = box.astype("int")
-            x = int(centerX - (width / 2))
-            y = int(centerY - (height / 2))
-            boxes.append([x, y, int(width), int(height)])
-            confidences.append(float(confidence))
-            classIDs.append(classID)
+# # 1）过滤掉置信度低的框框（向量化解码，不再逐行循环）
+boxes, confidences, classIDs = decode_outputs(layerOutputs, W, H, CONFIDENCE)
 
 # # 2）应用非最大值抑制(non-maxima suppression，nms)进一步筛掉
 idxs = cv.dnn.NMSBoxes(boxes, confidences, CONFIDENCE, THRESHOLD) # boxes中，保留的box的索引index存入idxs
@@ -72,8 +58,7 @@ np.random.seed(42)
 COLORS = np.random.randint(0, 255, size=(len(labels), 3), dtype="uint8")  # 框框显示颜色，每一类有不同的颜色，每种颜色都是由RGB三个值组成的，所以size为(len(labels), 3)
 if len(idxs) > 0:
     for i in idxs.flatten():  # indxs是二维的，第0维是输出层，所以这里把它展平成1维
-        (x, y) = (boxes[i][0], boxes[i][1])
-        (w, h) = (boxes[i][2], boxes[i][3])
+        (x, y, w, h) = boxes[i].tolist()
 
         color = [int(c) for c in COLORS[classIDs[i]]]
         cv.rectangle(img, (x, y), (x+w, y+h), color, 2)  # 线条粗细为2px
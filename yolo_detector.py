@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+"""
+YOLO 检测器
+网络、输出层名称、标签和颜色表只加载一次，之后每张图片只需预处理 + 前向 + 后处理
+"""
+
+import os
+import time
+
+import numpy as np
+import cv2 as cv
+
+from model_loader import load_darknet, model_identity
+from profiling import NULL_PROFILER
+
+# YOLO 配置
+yolo_dir = os.path.dirname(os.path.abspath(__file__))
+weightsPath = os.path.join(yolo_dir, 'cfg/yolov3.weights')
+configPath = os.path.join(yolo_dir, 'cfg/yolov3.cfg')
+labelsPath = os.path.join(yolo_dir, 'cfg/coco.names')
+
+CONFIDENCE = 0.5  # 过滤弱检测的最小概率
+THRESHOLD = 0.4   # 非最大值抑制阈值
+INPUT_SIZE = 416  # 网络输入尺寸
+
+
+def load_labels(labels_path=labelsPath):
+    """读取类别标签"""
+    with open(labels_path, 'rt') as f:
+        return f.read().rstrip('\n').split('\n')
+
+
+def parse_classes(spec, labels):
+    """
+    解析 "person,car,bicycle" 形式的类别白名单
+
+    Returns:
+        升序的类别 ID 数组 (int32)，spec 为空时返回 None（检测所有类别）
+
+    Raises:
+        ValueError: 类别名为空或未知
+    """
+    if not spec:
+        return None
+    ids = set()
+    for name in spec.split(','):
+        name = name.strip()
+        if not name:
+            raise ValueError(f"类别名为空: '{spec}'，应为 person,car 形式")
+        if name not in labels:
+            raise ValueError(f"未知类别: {name}")
+        ids.add(labels.index(name))
+    return np.array(sorted(ids), dtype=np.int32)
+
+
+def make_colors(count):
+    """每一类有不同的颜色，固定随机种子保证多次运行颜色一致"""
+    np.random.seed(42)
+    return np.random.randint(0, 255, size=(count, 3), dtype="uint8")
+
+
+def detected_output_path(image_path):
+    """检测结果图片的保存路径"""
+    return image_path.replace('.jpg', '_detected.jpg').replace('.png', '_detected.png')
+
+
+def letterbox_params(W, H, size):
+    """
+    计算 letterbox 缩放参数：保持宽高比缩放后居中放入 size x size 画布
+
+    Returns:
+        (scale, dx, dy, new_w, new_h)
+    """
+    scale = min(size / W, size / H)
+    new_w = int(round(W * scale))
+    new_h = int(round(H * scale))
+    dx = (size - new_w) // 2
+    dy = (size - new_h) // 2
+    return scale, dx, dy, new_w, new_h
+
+
+class Preprocessor:
+    """
+    复用缓冲区的预处理：缩放到预分配的 uint8 画布，再归一化写入预分配的 NCHW blob
+
+    稳态下每帧不再分配新的缩放图和 float blob。返回的 blob 在下一次调用时会被覆盖，
+    不能跨线程共享。
+    """
+
+    PAD_VALUE = 127  # letterbox 填充灰色
+
+    def __init__(self, size=INPUT_SIZE, letterbox=False):
+        """
+        Args:
+            size: 网络输入尺寸
+            letterbox: True 时保持宽高比并填充，False 时与 blobFromImage 相同直接拉伸
+        """
+        self.size = size
+        self.letterbox = letterbox
+        self.canvas = np.full((size, size, 3), self.PAD_VALUE, dtype=np.uint8)
+        self.blob = np.empty((1, 3, size, size), dtype=np.float32)
+        self._geometry = None
+
+    def __call__(self, img):
+        """
+        Returns:
+            (blob, letterbox)，letterbox 为 (scale, dx, dy)，拉伸模式下为 None
+        """
+        (H, W) = img.shape[:2]
+        letterbox = None
+
+        if self.letterbox:
+            scale, dx, dy, new_w, new_h = letterbox_params(W, H, self.size)
+            # 尺寸变化时才重置填充区域
+            if self._geometry != (dx, dy, new_w, new_h):
+                self.canvas.fill(self.PAD_VALUE)
+                self._geometry = (dx, dy, new_w, new_h)
+            cv.resize(img, (new_w, new_h), dst=self.canvas[dy:dy + new_h, dx:dx + new_w])
+            letterbox = (scale, dx, dy)
+        else:
+            cv.resize(img, (self.size, self.size), dst=self.canvas)
+
+        # BGR -> RGB、HWC -> CHW、除以 255，直接写入 blob
+        np.multiply(self.canvas[..., ::-1].transpose(2, 0, 1), np.float32(1.0 / 255.0),
+                    out=self.blob[0], casting='unsafe')
+        return self.blob, letterbox
+
+
+def letterbox_blob(img, size):
+    """
+    letterbox 预处理（每次分配新缓冲区，可在多线程中使用）
+
+    Returns:
+        (blob, (scale, dx, dy))
+    """
+    (H, W) = img.shape[:2]
+    scale, dx, dy, new_w, new_h = letterbox_params(W, H, size)
+    canvas = np.full((size, size, 3), Preprocessor.PAD_VALUE, dtype=np.uint8)
+    canvas[dy:dy + new_h, dx:dx + new_w] = cv.resize(img, (new_w, new_h))
+    blob = cv.dnn.blobFromImage(canvas, 1.0/255.0, (size, size), None, True, False)
+    return blob, (scale, dx, dy)
+
+
+def decode_outputs(layerOutputs, W, H, confidence=CONFIDENCE, letterbox=None, input_size=INPUT_SIZE,
+                   classes=None):
+    """
+    向量化解码 YOLO 输出层
+
+    各输出层先按 objectness 过滤再拼接，argmax、阈值过滤、中心点转左上角
+    和缩放到图片尺寸都以整个数组的运算完成。
+
+    Args:
+        layerOutputs: net.forward 的输出，每行为 [center_x, center_y, width, height, objectness, 各类别得分]
+        W: 图片宽度
+        H: 图片高度
+        confidence: 置信度阈值
+        letterbox: letterbox 预处理的 (scale, dx, dy)，为 None 时按拉伸预处理解码
+        input_size: 网络输入尺寸（letterbox 解码时使用）
+        classes: 类别白名单（升序的类别 ID 数组），只对这些类别的得分列做 argmax，为 None 时检测所有类别
+
+    Returns:
+        (boxes, confidences, classIDs)
+        boxes 为 (N, 4) int32 的 [x, y, w, h]，confidences 为 (N,) float32，classIDs 为 (N,) int32
+    """
+    # 类别得分 = objectness * 类别概率，不会超过 objectness，
+    # 先按 objectness 过滤，绝大多数行不需要读取类别得分，也不需要拼接
+    rows = [out.reshape(-1, out.shape[-1]) for out in layerOutputs]
+    detections = np.concatenate([r[r[:, 4] > confidence] for r in rows])
+    scores = detections[:, 5:] if classes is None else detections[:, 5 + classes]
+
+    # 再用最高得分过滤，只对保留下来的行做 argmax
+    mask = scores.max(axis=1) > confidence
+    kept = detections[mask]
+    kept_scores = scores[mask]
+
+    classIDs = kept_scores.argmax(axis=1)
+    confidences = kept_scores[np.arange(len(kept_scores)), classIDs].astype(np.float32)
+    classIDs = (classIDs if classes is None else classes[classIDs]).astype(np.int32)
+
+    # 将边界框放回图片尺寸，并由中心点转为左上角
+    if letterbox is None:
+        box = (kept[:, 0:4] * np.array([W, H, W, H])).astype(np.int32)
+    else:
+        # 先还原到画布坐标，去掉填充偏移，再按缩放比例还原
+        scale, dx, dy = letterbox
+        box = kept[:, 0:4] * float(input_size)
+        box[:, 0] -= dx
+        box[:, 1] -= dy
+        box = (box / scale).astype(np.int32)
+    boxes = np.empty_like(box)
+    boxes[:, 0] = box[:, 0] - box[:, 2] / 2
+    boxes[:, 1] = box[:, 1] - box[:, 3] / 2
+    boxes[:, 2:] = box[:, 2:]
+
+    return boxes, confidences, classIDs
+
+
+def split_batch_outputs(layerOutputs, n):
+    """
+    将批量前向的输出按图片拆开
+
+    批量前向时每个输出层形状为 (N, rows, 5 + 类别数)，单张时为 (rows, 5 + 类别数)。
+
+    Returns:
+        长度为 n 的列表，每个元素是该图片的 layerOutputs
+    """
+    layerOutputs = [out.reshape(n, -1, out.shape[-1]) for out in layerOutputs]
+    return [[out[i] for out in layerOutputs] for i in range(n)]
+
+
+class DetectionPostprocessor:
+    """
+    解码、NMS、结果组装和绘制
+
+    与网络无关，YoloDetector 和重放后端（output_replay.ReplayDetector）共用，
+    需要的只是标签、颜色表、输入尺寸和可选的 NMS 引擎 / 类别白名单。
+    """
+
+    def __init__(self, labels_path=labelsPath, input_size=INPUT_SIZE, letterbox=False, nms=None, classes=None):
+        """
+        Args:
+            labels_path: 类别标签文件路径
+            input_size: 网络输入尺寸（letterbox 解码时使用）
+            letterbox: 是否使用保持宽高比的 letterbox 预处理
+            nms: NmsEngine（见 nms.py），按类别阈值 / 按类别抑制 / 最大检测数；
+                 为 None 时使用 cv.dnn.NMSBoxes（所有类别一起抑制）
+            classes: 类别白名单（见 parse_classes），解码时只处理这些类别，为 None 时检测所有类别
+        """
+        self.labels_path = labels_path
+        self.input_size = input_size
+        self.letterbox = letterbox
+        self.nms = nms
+        self.classes = classes
+        self.labels = load_labels(labels_path)
+        self.colors = make_colors(len(self.labels))
+
+    def decode(self, layerOutputs, W, H, confidence=CONFIDENCE, letterbox=None):
+        """解码输出层（配置了按类别置信度时按其中的最低值解码，配置了类别白名单时只解码白名单类别）"""
+        if self.nms is not None:
+            confidence = self.nms.min_confidence(confidence)
+        return decode_outputs(layerOutputs, W, H, confidence, letterbox, self.input_size, self.classes)
+
+    def suppress(self, boxes, confidences, classIDs, confidence=CONFIDENCE, threshold=THRESHOLD, image_ids=None):
+        """
+        非极大值抑制
+
+        Returns:
+            保留框的下标
+        """
+        if self.nms is not None:
+            return self.nms(boxes, confidences, classIDs, confidence, threshold, image_ids)
+        idxs = cv.dnn.NMSBoxes(boxes, confidences, confidence, threshold)
+        return np.asarray(idxs, dtype=np.int64).reshape(-1)
+
+    def postprocess(self, layerOutputs, W, H, confidence=CONFIDENCE, threshold=THRESHOLD, letterbox=None):
+        """
+        过滤低置信度检测并应用 NMS
+
+        Returns:
+            (boxes, confidences, classIDs)，均为 NumPy 数组
+        """
+        boxes, confidences, classIDs = self.decode(layerOutputs, W, H, confidence, letterbox)
+        idxs = self.suppress(boxes, confidences, classIDs, confidence, threshold)
+        return boxes[idxs], confidences[idxs], classIDs[idxs]
+
+    def postprocess_batch(self, imgs, per_image, batch_time, confidence=CONFIDENCE, threshold=THRESHOLD,
+                          letterboxes=None):
+        """
+        对批量前向拆分后的输出逐张后处理
+
+        Returns:
+            检测结果字典列表
+        """
+        if letterboxes is None:
+            letterboxes = [None] * len(imgs)
+
+        if self.nms is not None:
+            per_image_detections = self._batched_nms(imgs, per_image, confidence, threshold, letterboxes)
+        else:
+            per_image_detections = [
+                self.postprocess(layerOutputs, img.shape[1], img.shape[0], confidence, threshold, letterbox)
+                for img, layerOutputs, letterbox in zip(imgs, per_image, letterboxes)
+            ]
+
+        results = []
+        for boxes, confidences, classIDs in per_image_detections:
+            result = self.make_result(boxes, confidences, classIDs, batch_time / len(imgs))
+            result['batch_time'] = batch_time
+            result['batch_size'] = len(imgs)
+            results.append(result)
+        return results
+
+    def _batched_nms(self, imgs, per_image, confidence, threshold, letterboxes):
+        """所有图片的候选框一次 NMS（按图片编号分组，不同图片互不抑制）"""
+        decoded = [self.decode(layerOutputs, img.shape[1], img.shape[0], confidence, letterbox)
+                   for img, layerOutputs, letterbox in zip(imgs, per_image, letterboxes)]
+        counts = [len(confs) for _, confs, _ in decoded]
+        boxes = np.concatenate([d[0] for d in decoded])
+        confidences = np.concatenate([d[1] for d in decoded])
+        classIDs = np.concatenate([d[2] for d in decoded])
+        image_ids = np.repeat(np.arange(len(decoded)), counts)
+
+        idxs = self.suppress(boxes, confidences, classIDs, confidence, threshold, image_ids)
+        owner = image_ids[idxs]
+        return [(boxes[idxs[owner == i]], confidences[idxs[owner == i]], classIDs[idxs[owner == i]])
+                for i in range(len(decoded))]
+
+    def make_result(self, boxes, confidences, classIDs, inference_time):
+        """组装检测结果字典"""
+        # NMS 之后的结果很少，转成 Python 列表便于分析和 JSON 导出
+        return {
+            'boxes': boxes.tolist(),
+            'confidences': confidences.tolist(),
+            'classIDs': classIDs.tolist(),
+            'inference_time': inference_time
+        }
+
+    def draw(self, img, boxes, confidences, classIDs):
+        """在图片上绘制检测框和标签"""
+        for (x, y, w, h), conf, classID in zip(boxes, confidences, classIDs):
+            color = [int(c) for c in self.colors[classID]]
+            cv.rectangle(img, (x, y), (x+w, y+h), color, 2)
+            text = "{}: {:.2%}".format(self.labels[classID], conf)
+            cv.putText(img, text, (x, y-5), cv.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        return img
+
+
+class YoloDetector(DetectionPostprocessor):
+    """长期持有的 YOLO 检测器"""
+
+    def __init__(self, config_path=configPath, weights_path=weightsPath, labels_path=labelsPath,
+                 input_size=INPUT_SIZE, letterbox=False, load_mode='file', warmup=False, nms=None, classes=None):
+        """
+        加载网络、输出层名称、标签和颜色表
+
+        Args:
+            config_path: cfg 配置文件路径
+            weights_path: 权重文件路径
+            labels_path: 类别标签文件路径
+            input_size: 网络输入尺寸
+            letterbox: 是否使用保持宽高比的 letterbox 预处理
+            load_mode: 权重加载方式，'file' 或 'mmap'，见 model_loader.load_darknet
+            warmup: 是否在加载时做一次前向，提前完成网络初始化和层融合
+            nms: NmsEngine（见 nms.py），按类别阈值 / 按类别抑制 / 最大检测数；
+                 为 None 时使用 cv.dnn.NMSBoxes（所有类别一起抑制）
+            classes: 类别白名单（见 parse_classes），解码时只处理这些类别，为 None 时检测所有类别
+        """
+        self.config_path = config_path
+        self.weights_path = weights_path
+        self.load_mode = load_mode
+        self.preprocessor = Preprocessor(input_size, letterbox)
+        self._outputs = {}  # 按输入形状缓存的预分配输出
+
+        self._model_id = None
+        self.net, self.load_timings = load_darknet(config_path, weights_path, load_mode)
+        self.out_names = self.net.getUnconnectedOutLayersNames()
+
+        start = time.time()
+        super().__init__(labels_path, input_size, letterbox, nms, classes)
+        self.load_timings['labels'] = time.time() - start
+
+        if warmup:
+            start = time.time()
+            self.forward(np.zeros((input_size, input_size, 3), dtype=np.uint8))
+            self.load_timings['warmup'] = time.time() - start
+
+    @property
+    def model_id(self):
+        """
+        模型标识（cfg + 权重的内容哈希，见 model_loader.model_identity）
+
+        只有结果缓存和输出录制需要，首次访问时才计算；权重文件变化后的首次计算需要读取整个文件。
+        """
+        if self._model_id is None:
+            self._model_id = model_identity(self.config_path, self.weights_path)
+        return self._model_id
+
+    def set_input_size(self, size):
+        """运行时切换网络输入尺寸（Darknet 网络支持任意 32 倍数的输入）"""
+        if size == self.input_size:
+            return
+        self.input_size = size
+        self.preprocessor = Preprocessor(size, self.letterbox)
+        self._outputs = {}
+
+    def make_blob(self, img):
+        """
+        图片转为网络输入 blob（每次分配新缓冲区，可在多线程中使用）
+
+        Returns:
+            (blob, letterbox)
+        """
+        if self.letterbox:
+            return letterbox_blob(img, self.input_size)
+        return cv.dnn.blobFromImage(img, 1.0/255.0, (self.input_size, self.input_size), None, True, False), None
+
+    def forward_blob(self, blobImg):
+        """
+        对已经生成的 blob 前向传播
+
+        输出写入按输入形状预分配的缓冲区，返回的 layerOutputs 会在下一次
+        相同形状的前向时被覆盖，需要保留时请自行复制。
+
+        Returns:
+            (layerOutputs, inference_time)
+        """
+        self.net.setInput(blobImg)
+        outputs = self._outputs.get(blobImg.shape)
+
+        start = time.time()
+        if outputs is None:
+            layerOutputs = self.net.forward(self.out_names)
+        else:
+            layerOutputs = self.net.forward(outBlobNames=self.out_names, outputBlobs=outputs)
+        end = time.time()
+
+        self._outputs[blobImg.shape] = layerOutputs
+        return layerOutputs, end - start
+
+    def forward(self, img):
+        """
+        预处理并前向传播（使用复用的预处理缓冲区）
+
+        Returns:
+            (layerOutputs, inference_time, letterbox)
+        """
+        blobImg, letterbox = self.preprocessor(img)
+        layerOutputs, inference_time = self.forward_blob(blobImg)
+        return layerOutputs, inference_time, letterbox
+
+    def forward_batch(self, imgs):
+        """
+        多张图片组成一个 NCHW blob，一次前向传播
+
+        Returns:
+            (每张图片的 layerOutputs 列表, 整批推理时间, 每张图片的 letterbox 参数列表)
+        """
+        if self.letterbox:
+            blobs, letterboxes = zip(*[letterbox_blob(img, self.input_size) for img in imgs])
+            blobImg = np.concatenate(blobs)
+        else:
+            blobImg = cv.dnn.blobFromImages(imgs, 1.0/255.0, (self.input_size, self.input_size), None, True, False)
+            letterboxes = [None] * len(imgs)
+        layerOutputs, batch_time = self.forward_blob(blobImg)
+        return split_batch_outputs(layerOutputs, len(imgs)), batch_time, list(letterboxes)
+
+    def detect(self, img, confidence=CONFIDENCE, threshold=THRESHOLD, profiler=NULL_PROFILER, output_hook=None):
+        """
+        对单张图片执行检测
+
+        Args:
+            img: BGR 图片 (cv.imread 的结果)
+            confidence: 置信度阈值
+            threshold: NMS 阈值
+            profiler: StageProfiler，记录 preprocess / forward / postprocess 阶段耗时
+            output_hook: 前向后、后处理前调用 output_hook(layerOutputs, W, H, letterbox, inference_time)，
+                         用于录制原始输出（layerOutputs 会在下一次前向时被覆盖，需在回调内使用完）
+
+        Returns:
+            检测结果字典
+        """
+        (H, W) = img.shape[:2]
+        with profiler.span('preprocess'):
+            blobImg, letterbox = self.preprocessor(img)
+        layerOutputs, inference_time = self.forward_blob(blobImg)
+        profiler.record('forward', inference_time)
+        profiler.record_layers(self.net)
+        if output_hook is not None:
+            output_hook(layerOutputs, W, H, letterbox, inference_time)
+        with profiler.span('postprocess'):
+            boxes, confidences, classIDs = self.postprocess(layerOutputs, W, H, confidence, threshold, letterbox)
+            result = self.make_result(boxes, confidences, classIDs, inference_time)
+        return result
+
+    def detect_batch(self, imgs, confidence=CONFIDENCE, threshold=THRESHOLD):
+        """
+        对一组图片执行一次批量前向并分别后处理
+
+        Args:
+            imgs: BGR 图片列表，尺寸可以不同（各自按原图 W/H 缩放检测框）
+            confidence: 置信度阈值
+            threshold: NMS 阈值
+
+        Returns:
+            (检测结果字典列表, 整批推理时间)
+            每张图片的 inference_time 为整批推理时间均摊到单张的值
+        """
+        per_image, batch_time, letterboxes = self.forward_batch(imgs)
+        results = self.postprocess_batch(imgs, per_image, batch_time, confidence, threshold, letterboxes)
+        return results, batch_time